@@ -0,0 +1,299 @@
+# Benchmark suite for the geometry, parsing and rendering hot paths
+# Synthetic core and FA maps are generated from 17x17 up to very large lattices
+# Every case reports the best wall time, the peak memory (tracemalloc) and,
+# for the figures, the number of traces and layout shapes
+# Figures are only built, never shown, so the suite runs headless
+# Import time of the modules is measured in a fresh interpreter, together with whether plotly got loaded
+#
+# Usage (from the repository root):
+#   python benchmarks/run_benchmarks.py                     run every case
+#   python benchmarks/run_benchmarks.py --quick             small sizes only
+#   python benchmarks/run_benchmarks.py -k render           cases whose name contains 'render'
+#   python benchmarks/run_benchmarks.py --json base.json    save the results
+#   python benchmarks/run_benchmarks.py --compare base.json flag cases slower than base by --threshold
+# A few consistency checks run before the timings, a failed check makes the suite exit with 1
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+src_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, src_directory)
+
+from CoreGeometry import core_geometry, geometry_sweep
+from CoreMapVis import core_reader, core_map_figure, iter_core_reader
+from FAMapVis import FA_reader, FA_figure
+from InitialCoreVisualizer import init_core_figure
+from LatticeMap import LatticeMap
+from MapLibrary import LibraryWriter, open_library
+from PatternAnalysis import pattern_analysis
+from PatternHash import pattern_hash, pattern_hashes
+
+# Pin parameters of a typical PWR assembly
+fuel_radius = 0.4096
+gap = 0.0084
+cladding_thickness = 0.0572
+fuel_to_moderator_ratio = 0.45
+
+# Sizes of the synthetic maps, number of cells in one side of the 1/4 symmetry map
+core_sizes = [9, 17, 33, 65, 129]
+pin_counts = [17, 33, 65, 129, 257]
+type_counts = [1, 3, 6]
+quick_core_sizes = [9, 17]
+quick_pin_counts = [17, 33]
+
+# Symbol used by the string maps, 'O' is the empty position or guide tube
+letters = "ABCDEFGHIJKLMN"
+
+# Random 1/4 symmetry core map, FA inside the quarter circle and empty outside
+def synthetic_core_map(size, num_type, string=False, seed=0):
+    rng = np.random.default_rng(seed)
+    rows, cols = np.indices((size, size))
+    inside = rows**2 + cols**2 < size**2
+    core_map = np.where(inside, rng.integers(1, num_type + 1, (size, size)), 0)
+    if string:
+        return np.array(['O'] + list(letters[:num_type]))[core_map]
+
+    return core_map
+
+# Random 1/4 symmetry FA map with about 8% guide tubes
+def synthetic_fa_map(nPin, num_type, string=False, seed=0):
+    rng = np.random.default_rng(seed)
+    size = (nPin + 1)//2
+    fa_map = rng.integers(1, num_type + 1, (size, size))
+    fa_map[rng.random((size, size)) < 0.08] = 0
+    if string:
+        return np.array(['O'] + list(letters[:num_type]))[fa_map]
+
+    return fa_map
+
+# Parameters of the core visualizer matching a synthetic core map
+def core_params(size):
+    FA_size = 21.5
+    return {
+        'core_radius': size*FA_size*1.05,
+        'active_core_radius': size*FA_size,
+        'FA_size': FA_size,
+        'num_FA': size,
+    }
+
+# Parameters of the FA visualizer
+def fa_params(nPin):
+    pitch_size = np.sqrt((fuel_radius + gap + cladding_thickness)**2*np.pi/fuel_to_moderator_ratio)
+    return {
+        'fuel_radius': fuel_radius,
+        'gap': gap,
+        'cladding_thickness': cladding_thickness,
+        'nPin': nPin,
+        'pitch_size': pitch_size,
+        'FA_size': pitch_size*nPin,
+    }
+
+# Number of traces and layout shapes of a figure, None for the other results
+def figure_size(result):
+    if hasattr(result, 'layout'):
+        return len(result.data), len(result.layout.shapes)
+
+    return None
+
+# Run one case, best wall time of repeat runs, then one more run under tracemalloc for the peak memory
+def measure(name, function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    record = {'name': name, 'time': min(times), 'peak_memory': peak}
+    size = figure_size(result)
+    if size is not None:
+        record['traces'], record['shapes'] = size
+
+    return record
+
+# All benchmark cases, as (name, function) pairs
+def build_cases(directory, quick):
+    sizes = quick_core_sizes if quick else core_sizes
+    pins = quick_pin_counts if quick else pin_counts
+    cases = []
+
+    # Geometry, the core radius grows with the number of FA in the diameter
+    for nPin in pins:
+        for core_radius in (170, 400, 1000):
+            cases.append(("geometry nPin=%d core_radius=%d" % (nPin, core_radius),
+                          lambda nPin=nPin, core_radius=core_radius:
+                          core_geometry(fuel_radius, gap, cladding_thickness, nPin,
+                                        fuel_to_moderator_ratio, core_radius, 0.5)))
+
+    points = 10**4 if quick else 10**6
+    rng = np.random.default_rng(0)
+    radius = rng.uniform(100, 300, points)
+    ratio = rng.uniform(0.3, 0.6, points)
+    cases.append(("geometry_sweep points=%d" % points,
+                  lambda: geometry_sweep(fuel_radius, gap, cladding_thickness, 17, ratio, radius, 0.5, layers=False)))
+
+    # Parsing and analysis of the core maps
+    for size in sizes:
+        for num_type in type_counts:
+            for string in (False, True):
+                kind = "str" if string else "num"
+                filename = os.path.join(directory, "core_%d_%d_%s.txt" % (size, num_type, kind))
+                np.savetxt(filename, synthetic_core_map(size, num_type, string), fmt='%s')
+                cases.append(("core_reader size=%d types=%d %s" % (size, num_type, kind),
+                              lambda filename=filename: core_reader(filename)))
+
+            analysis = core_reader(os.path.join(directory, "core_%d_%d_num.txt" % (size, num_type)))
+            cases.append(("pattern_analysis size=%d types=%d" % (size, num_type),
+                          lambda analysis=analysis, size=size: pattern_analysis(analysis, size)))
+            cases.append(("render core_map_figure size=%d types=%d" % (size, num_type),
+                          lambda analysis=analysis, size=size: core_map_figure(analysis, core_params(size))))
+
+    # Parsing and rendering of the FA maps, the filename follows nPin_<free text>.txt
+    for nPin in pins:
+        for num_type in type_counts:
+            for string in (False, True):
+                kind = "str" if string else "num"
+                filename = os.path.join(directory, "%d_%d_%s.txt" % (nPin, num_type, kind))
+                np.savetxt(filename, synthetic_fa_map(nPin, num_type, string), fmt='%s')
+                cases.append(("FA_reader nPin=%d types=%d %s" % (nPin, num_type, kind),
+                              lambda filename=filename: FA_reader(filename)))
+
+            analysis = FA_reader(os.path.join(directory, "%d_%d_num.txt" % (nPin, num_type)))
+            cases.append(("render FA_figure nPin=%d types=%d" % (nPin, num_type),
+                          lambda analysis=analysis, nPin=nPin: FA_figure(fa_params(nPin), analysis)))
+
+        geometry = core_geometry(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, 400, 0.5)
+        cases.append(("render init_core_figure nPin=%d" % nPin,
+                      lambda geometry=geometry: init_core_figure(geometry)))
+
+    return cases
+
+# One map hashes the same from a text archive, from an array and from a library holding more labels than the map
+def pattern_hash_check(directory):
+    first = synthetic_core_map(9, 2, string=True, seed=1)
+    second = synthetic_core_map(9, 5, string=True, seed=2)
+    archive = os.path.join(directory, "hash_archive.txt")
+    with open(archive, "w") as f:
+        for core_map in (first, second):
+            f.write("\n".join(" ".join(row) for row in core_map) + "\n\n")
+    with LibraryWriter(os.path.join(directory, "hash_library")) as writer:
+        writer.append(first)
+        writer.append(second)
+    library = open_library(os.path.join(directory, "hash_library"))
+
+    for relabel in (False, True):
+        hashes = {
+            pattern_hash(LatticeMap.from_array(first), relabel),
+            pattern_hash(next(iter_core_reader(archive))['lattice'], relabel),
+            pattern_hash(library[0], relabel),
+            pattern_hashes(library.codes, library.labels, relabel)[0],
+        }
+        if len(hashes) != 1:
+            return "pattern hash of one map differs between sources (relabel=%s)" % relabel
+
+    return None
+
+consistency_checks = [('pattern_hash sources', pattern_hash_check)]
+
+# Modules timed at import, plotly itself is the reference of the plotting cost
+import_modules = ['CoreGeometry', 'MapParser', 'LatticeMap', 'CoreMapVis', 'FAMapVis', 'InitialCoreVisualizer',
+                  'BatchRunner', 'plotly.graph_objects']
+
+# Code run in the fresh interpreter, prints the import time and whether plotly is loaded
+import_script = """
+import sys, time
+sys.path.insert(0, %r)
+import numpy
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+print(elapsed, any(name.split('.')[0] == 'plotly' for name in sys.modules))
+"""
+
+# Import time of a module, best of repeat fresh interpreters, NumPy is imported before the timer starts
+def measure_import(module, repeat):
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', import_script % (src_directory, module)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        times.append(float(output[0]))
+
+    return {'name': "import %s" % module, 'time': min(times), 'plotly_loaded': output[1] == 'True'}
+
+# Cases slower than the baseline by more than threshold times
+def regressions(records, baseline, threshold):
+    base = {record['name']: record for record in baseline}
+    slow = []
+    for record in records:
+        if record['name'] in base and record['time'] > threshold*base[record['name']]['time']:
+            slow.append((record['name'], base[record['name']]['time'], record['time']))
+
+    return slow
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the geometry, parsing and rendering hot paths")
+    parser.add_argument('--quick', action='store_true', help="only the small sizes")
+    parser.add_argument('-k', dest='keyword', default=None, help="only the cases whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case, the best one is reported")
+    parser.add_argument('--json', default=None, help="write the results to this file")
+    parser.add_argument('--compare', default=None, help="baseline results written by --json")
+    parser.add_argument('--threshold', type=float, default=1.5, help="allowed slow down against the baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        failed = [(name, check(directory)) for name, check in consistency_checks]
+    failed = [(name, message) for name, message in failed if message is not None]
+    for name, message in failed:
+        print("CHECK FAILED %s: %s" % (name, message))
+    if failed:
+        return 1
+
+    records = []
+    for module in import_modules:
+        name = "import %s" % module
+        if args.keyword is not None and args.keyword not in name:
+            continue
+        record = measure_import(module, args.repeat)
+        records.append(record)
+        print("%-50s %10.3f ms   plotly loaded: %s" % (name, record['time']*1e3, record['plotly_loaded']))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, function in build_cases(directory, args.quick):
+            if args.keyword is not None and args.keyword not in name:
+                continue
+            record = measure(name, function, args.repeat)
+            records.append(record)
+
+            line = "%-50s %10.3f ms %10.1f KiB" % (name, record['time']*1e3, record['peak_memory']/1024)
+            if 'traces' in record:
+                line += " %6d traces %6d shapes" % (record['traces'], record['shapes'])
+            print(line)
+
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(records, f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            slow = regressions(records, json.load(f), args.threshold)
+        for name, before, after in slow:
+            print("REGRESSION %s: %.3f ms -> %.3f ms" % (name, before*1e3, after*1e3))
+        if slow:
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# Parallel Batch Runner for geometry sweeps and bulk map rendering
+# Every case is a dictionary with the inputs of core_geometry, and optionally
+# 'exact' for the exact FA fit, 'core_map_file' for CoreMapVis and 'fa_map_file' for FAMapVis
+# Cases are grouped in chunks and distributed over a ProcessPoolExecutor
+# Each case writes into its own directory, so max_core.txt and input.txt of different cases never collide
+
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from CoreGeometry import core_geometry, export_core_geometry
+
+# Inputs of core_geometry, in order
+geometry_keys = ['fuel_radius', 'gap', 'cladding_thickness', 'nPin', 'fuel_to_moderator_ratio', 'core_radius', 'core_gap_scale']
+
+# Run a single case inside its own directory
+# The HTML figures load plotly.js from plotlyjs, by default the copy written once in the output root
+def run_case(case, directory, figures=True, plotlyjs='../plotly.min.js'):
+    os.makedirs(directory, exist_ok=True)
+    result = {'name': case.get('name', os.path.basename(directory)), 'directory': directory}
+
+    try:
+        # Geometry and export of max_core.txt, input.txt and <nPin>_allfuel_FA.txt
+        geometry = core_geometry(*[case[key] for key in geometry_keys], exact=case.get('exact', False))
+        export_core_geometry(geometry, directory)
+        result['num_FA'] = geometry['num_FA']
+        result['total_FA'] = geometry['total_FA']
+        result['pitch_size'] = geometry['pitch_size']
+
+        # Plotting modules are only imported by the cases that draw something
+        if figures:
+            from InitialCoreVisualizer import init_core_figure
+            init_core_figure(geometry).write_html(os.path.join(directory, "init_core.html"), include_plotlyjs=plotlyjs)
+
+        # The geometry has the same keys as input.txt, so it is used as params of the visualizers
+        if 'core_map_file' in case:
+            from CoreMapVis import core_reader
+            analysis = core_reader(case['core_map_file'])
+            result['core_total_fa'] = analysis['total_fa']
+            if figures:
+                from CoreMapVis import core_map_figure
+                core_map_figure(analysis, geometry).write_html(os.path.join(directory, "core_map.html"), include_plotlyjs=plotlyjs)
+
+        if 'fa_map_file' in case:
+            from FAMapVis import FA_reader
+            analysis = FA_reader(case['fa_map_file'])
+            result['num_unique_pin'] = analysis['num_unique_pin']
+            if figures:
+                from FAMapVis import FA_figure
+                FA_figure(geometry, analysis).write_html(os.path.join(directory, "fa_map.html"), include_plotlyjs=plotlyjs)
+
+    # A failing case is reported in its result, the rest of the batch keeps running
+    except Exception as error:
+        result['error'] = repr(error)
+
+    return result
+
+# Run one chunk of cases in a worker process
+def run_chunk(chunk, figures):
+    return [run_case(case, directory, figures) for case, directory in chunk]
+
+# Default progress report, one line overwritten in place
+def print_progress(done, total):
+    sys.stdout.write("\r%d/%d cases done" % (done, total))
+    if done == total:
+        sys.stdout.write("\n")
+    sys.stdout.flush()
+
+# Run all cases on a process pool
+# Cases without 'name' are written to output_root/case_<index>
+# chunk_size cases are sent to a worker at once, by default about 4 chunks per worker
+# progress(done, total) is called every time a chunk is finished
+# Returns one result dictionary per case, in the same order as cases
+def run_batch(cases, output_root='batch_output', max_workers=None, chunk_size=None, figures=True,
+              progress=print_progress):
+    cases = list(cases)
+    total = len(cases)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, total // (4*max_workers))
+
+    # Every case gets its own output directory
+    jobs = []
+    for index, case in enumerate(cases):
+        name = case.get('name', "case_%05d" % index)
+        jobs.append((case, os.path.join(output_root, str(name))))
+
+    # plotly.js is written once, every HTML figure of the batch points to it
+    os.makedirs(output_root, exist_ok=True)
+    if figures:
+        from FigureExport import write_plotlyjs
+        write_plotlyjs(output_root)
+
+    results = [None] * total
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for start in range(0, total, chunk_size):
+            future = pool.submit(run_chunk, jobs[start:start + chunk_size], figures)
+            futures[future] = start
+
+        for future in as_completed(futures):
+            start = futures[future]
+            chunk_results = future.result()
+            results[start:start + len(chunk_results)] = chunk_results
+            done += len(chunk_results)
+            if progress is not None:
+                progress(done, total)
+
+    return results
+
+# Build the cases of a full grid of geometry inputs, every input is a list of values
+def grid_cases(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale, **extra):
+    cases = []
+    for values in itertools.product(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio,
+                                    core_radius, core_gap_scale):
+        case = dict(zip(geometry_keys, values))
+        case.update(extra)
+        cases.append(case)
+
+    return cases
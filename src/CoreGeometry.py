@@ -0,0 +1,251 @@
+# Core Geometry Calculator for square assemblies, constant core radius
+# This script holds the pure geometry part of the initial core mapper
+# It only needs NumPy, builds no figure and writes no file, so it can be called
+# many times inside an optimization loop
+# Input in FA : fuel radius, gap, cladding thickness, Npin per FA, fuel to moderator ratio
+# Output : dictionary with pitch size, FA size, number of FA per layer and the 1/4 symmetry maps
+
+import math
+import os
+import numpy as np
+from ParamStore import save_params
+from Instrumentation import count, is_enabled
+
+# Exact number of FA in each layer of the 1/4 core, counting only the FA fully inside the circle of radius
+# The outer corner of every FA is checked, not only the topside or the midpoint of the layer
+# Offset lattice (even number FA): the FA start at the axes, outer corner of FA [i][j] at ((j+1), (i+1))*FA_size
+# Centered lattice (odd number FA): FA [0][0] is centered on the axes, outer corner at ((j+1/2), (i+1/2))*FA_size
+# radius can be an array of any shape, the layers are added as last axis
+def inscribed_layers(radius, FA_size, centered, num_layer=None):
+    scaled = np.asarray(radius, dtype=float)/FA_size
+    shift = 0.5 if centered else 1.0
+    if num_layer is None:
+        num_layer = max(int(np.floor(np.max(scaled, initial=0) - shift)) + 1, 0)
+
+    # Corner of the layer in y, then the number of corners fitting in x
+    y = np.arange(num_layer) + shift
+    r2 = scaled[..., None]**2
+    x = np.sqrt(np.maximum(r2 - y**2, 0))
+    counts = np.floor(x + 1 - shift)
+
+    # Rounding of the square root can be off by one when a corner sits on the circle, check the last corner exactly
+    counts -= (counts > 0) & ((counts - 1 + shift)**2 + y**2 > r2)
+    counts += (counts + shift)**2 + y**2 <= r2
+
+    return counts.astype(int)
+
+# Number of FA in the full core from the 1/4 core layers of inscribed_layers
+# For the centered lattice row 0 and column 0 are shared with the next quarter, and the center FA with all of them
+def full_core_count(counts, centered):
+    total = 4*counts.sum(axis=-1)
+    if centered:
+        row_0 = counts[..., 0] if counts.shape[-1] else np.zeros(counts.shape[:-1], dtype=int)
+        column_0 = (counts > 0).sum(axis=-1)
+        total += -2*row_0 - 2*column_0 + (row_0 > 0)
+
+    return total
+
+# Fit both lattices inside the active core radius, radius can be an array
+# Returns the layers and full core number of FA of each lattice, and the lattice holding more FA
+# full_core_FA counts the whole core, unlike total_FA of core_geometry which counts the 1/4 map
+# On a tie the centered lattice is kept
+def exact_fit(active_core_radius, FA_size):
+    centered = inscribed_layers(active_core_radius, FA_size, True)
+    offset = inscribed_layers(active_core_radius, FA_size, False)
+    centered_total = full_core_count(centered, True)
+    offset_total = full_core_count(offset, False)
+
+    return {
+        'centered_layers': centered,
+        'offset_layers': offset,
+        'centered_total': centered_total,
+        'offset_total': offset_total,
+        'centered': centered_total >= offset_total,
+        'full_core_FA': np.maximum(centered_total, offset_total)
+    }
+
+# Search the core_gap_scale among the candidates for the most FA in the full core
+# Between candidates loading the same number of FA, the largest gap is kept
+# Every candidate is evaluated at once
+def gap_scale_search(core_radius, FA_size, core_gap_scale):
+    core_gap_scale = np.asarray(core_gap_scale, dtype=float).ravel()
+    fit = exact_fit(core_radius - core_gap_scale*FA_size, FA_size)
+
+    best = np.flatnonzero(fit['full_core_FA'] == fit['full_core_FA'].max())
+    best = best[np.argmax(core_gap_scale[best])]
+
+    return {
+        'core_gap_scale': core_gap_scale[best],
+        'centered': bool(fit['centered'][best]),
+        'full_core_FA': int(fit['full_core_FA'][best]),
+        'centered_total': fit['centered_total'],
+        'offset_total': fit['offset_total']
+    }
+
+# With exact=True the FA are counted with inscribed_layers inside the active core radius,
+# num_FA becomes the size of the 1/4 map of the lattice holding more FA, odd for centered and even for offset
+def core_geometry(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+                  exact=False):
+
+    # Calculate pitch size based on fuel to moderator ratio
+    clad_radius = fuel_radius + gap + cladding_thickness
+    pin_area = clad_radius**2 * math.pi / fuel_to_moderator_ratio
+    pitch_size = pin_area**(1/2)
+
+    # Calculate the size of fuel assembly
+    FA_size = pitch_size * nPin
+
+    # Calculate the number of FA, already in 1/4 symmetry, would be number of grids in the visualizer
+    core_gap = core_gap_scale*FA_size # Can be scaled according to the desired gap
+    active_core_radius = core_radius - core_gap
+    num_FA = round(active_core_radius/FA_size)
+
+    # Exact fit, the layers come from the corner check of the best lattice
+    if exact:
+        fit = exact_fit(active_core_radius, FA_size)
+        centered = bool(fit['centered'])
+        layers = fit['centered_layers'] if centered else fit['offset_layers']
+        num_FA = int(layers[0]) if len(layers) else 0
+        if num_FA % 2 != centered:
+            num_FA += 1
+        num_FA_layer = np.zeros(num_FA, dtype=int)
+        num_FA_layer[:min(len(layers), num_FA)] = layers[:num_FA]
+    else:
+        # Calculation for each layer
+        # See if the number of FA is odd or even
+        num_layer = num_FA
+        if num_FA % 2 == 0:
+            # For even number FA, the horizontal axis would be the bottom part of the FA, while the vertical axis would be the left part
+            # Get and array of y coordinate for the topside of each layer, as the limiting parameter of number of FA in each layer
+            y_coord = FA_size*np.arange(1, num_layer+1)
+        else:
+            # For odd number FA, the horizontal and vertical axis would be the midpoint of the FA
+            # Get and array of y coordinate for the midpoint of each layer, as the limiting parameter of number of FA in each layer
+            y_coord = FA_size*np.arange(1, 2*num_layer+1, 2)/2
+
+        # From the circle equation, we can determine the number of FA for each layer in the vertical axis
+        # x^2 + y^2 = r^2, with r^2 = (core_radius)^2
+        x_coord = np.sqrt(np.maximum(core_radius**2 - y_coord**2, 0))
+        num_FA_layer = np.floor(x_coord/FA_size).astype(int)
+
+    # Make a matrix to store the FA positions (1 for FA present, 0 for empty)
+    mat_size = math.ceil(num_FA)
+    core_map = (np.arange(mat_size)[None, :] < num_FA_layer[:, None]).astype(float)
+
+    # Make 1/4 symmetry FA matrix full of ones
+    if nPin % 2 == 0:
+        mat_size = nPin//2
+    else:
+        mat_size = (nPin+1)//2
+
+    mat_FA = np.ones((mat_size, mat_size))
+
+    # The keys follow the names in input.txt, so the result can be used as params of the visualizers
+    geometry = {
+        'fuel_radius': fuel_radius,
+        'gap': gap,
+        'cladding_thickness': cladding_thickness,
+        'nPin': nPin,
+        'fuel_to_moderator_ratio': fuel_to_moderator_ratio,
+        'core_radius': core_radius,
+        'core_gap': core_gap,
+        'active_core_radius': active_core_radius,
+        'num_FA': num_FA,
+        'FA_size': FA_size,
+        'pitch_size': pitch_size,
+        'num_FA_layer': num_FA_layer,
+        # Number of FA in the 1/4 map, full_core_FA of exact_fit counts the whole core
+        'total_FA': int(core_map.sum()),
+        'core_map': core_map,
+        'mat_FA': mat_FA
+    }
+
+    return geometry
+
+# Sweep core_geometry over arrays of parameters at once
+# Every parameter can be a scalar or an array, they are broadcasted together like NumPy does
+# With grid=True every parameter is taken as its own axis, so the result covers all combinations
+# Returns a structured array with the broadcasted shape, one record per parameter set
+# num_FA_layer is stored per record, padded with 0 after num_FA layers, layers=False skips it
+def geometry_sweep(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+                   grid=False, layers=True):
+    inputs = [fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale]
+    if grid:
+        inputs = np.meshgrid(*[np.ravel(value) for value in inputs], indexing='ij', sparse=True)
+    fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale = \
+        np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in inputs])
+    shape = fuel_radius.shape
+
+    # Same calculation as core_geometry, element wise
+    clad_radius = fuel_radius + gap + cladding_thickness
+    pitch_size = np.sqrt(clad_radius**2 * np.pi / fuel_to_moderator_ratio)
+    FA_size = pitch_size * nPin
+    core_gap = core_gap_scale*FA_size
+    active_core_radius = core_radius - core_gap
+    # np.rint rounds half to even, same as the built in round
+    num_FA = np.rint(active_core_radius/FA_size).astype(int)
+
+    # Count the FA layer by layer, every layer is one vectorized pass over all parameter sets
+    # For even number FA the limit is the topside of the layer, for odd number FA it is the midpoint
+    odd = num_FA % 2 == 1
+    max_layer = max(int(num_FA.max(initial=0)), 0)
+    total_FA = np.zeros(shape, dtype=int)
+    if layers:
+        num_FA_layer = np.zeros(shape + (max_layer,), dtype=np.int32)
+    for layer in range(max_layer):
+        y_coord = np.where(odd, (layer + 0.5)*FA_size, (layer + 1)*FA_size)
+        x_coord = np.sqrt(np.maximum(core_radius**2 - y_coord**2, 0))
+        num_fa = np.where(layer < num_FA, np.floor(x_coord/FA_size), 0).astype(int)
+        # Same as the sum of core_map, a layer can not hold more than num_FA
+        total_FA += np.minimum(num_fa, num_FA)
+        if layers:
+            num_FA_layer[..., layer] = num_fa
+
+    # One column per quantity, nPin and the FA counts are kept as integer
+    columns = {
+        'fuel_radius': fuel_radius,
+        'gap': gap,
+        'cladding_thickness': cladding_thickness,
+        'nPin': nPin.astype(int),
+        'fuel_to_moderator_ratio': fuel_to_moderator_ratio,
+        'core_radius': core_radius,
+        'core_gap_scale': core_gap_scale,
+        'pitch_size': pitch_size,
+        'FA_size': FA_size,
+        'core_gap': core_gap,
+        'active_core_radius': active_core_radius,
+        'num_FA': num_FA,
+        'total_FA': total_FA
+    }
+    fields = [(key, value.dtype) for key, value in columns.items()]
+    if layers:
+        columns['num_FA_layer'] = num_FA_layer
+        fields.append(('num_FA_layer', np.int32, (max_layer,)))
+
+    table = np.empty(shape, dtype=fields)
+    for key, value in columns.items():
+        table[key] = value
+
+    return table
+
+# Export the geometry as max_core.txt, input.txt and <nPin>_allfuel_FA.txt inside directory
+def export_core_geometry(geometry, directory='.'):
+    os.makedirs(directory, exist_ok=True)
+
+    # Export the 1/4 symettry core map as max_core.txt
+    np.savetxt(os.path.join(directory, "max_core.txt"), geometry['core_map'], fmt='%d')
+
+    # Export inputed parameters as input.txt, replaced at once so a concurrent reader never sees half of it
+    keys = ['fuel_radius', 'gap', 'cladding_thickness', 'nPin', 'fuel_to_moderator_ratio', 'core_radius',
+            'core_gap', 'active_core_radius', 'num_FA', 'FA_size', 'pitch_size']
+    save_params({key: geometry[key] for key in keys}, os.path.join(directory, "input.txt"))
+
+    # Export the 1/4 symettry single fuel assembly map as <nPin>_allfuel_FA.txt
+    filename = "%d_allfuel_FA.txt" % geometry['nPin']
+    np.savetxt(os.path.join(directory, filename), geometry['mat_FA'], fmt='%d')
+
+    count('files_written', 3)
+    if is_enabled():
+        count('bytes_written', sum(os.path.getsize(os.path.join(directory, name)) for name in ["max_core.txt", filename]))
+
+    return 0
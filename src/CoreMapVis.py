@@ -6,66 +6,47 @@
 # Denoted in the FA index from 0 to 6, as 0 means absence of FA, and 1 to 6 means presence of different FA
 # Additional function is made to read string input, with general rule of 'O' for empty space
 
-import numpy as np
-import math
-import plotly.graph_objects as go
+from LatticeMap import LatticeMap
+from MapParser import iter_parse_maps
+from ParamStore import load_params
+from PatternAnalysis import pattern_analysis
+from MapRenderer import core_map_traces, map_template
+from Instrumentation import stage
+
+# Colors of the FA kinds, in the order of the sorted FA labels
+fa_colors = ["#ff6637", "#56423c", "#bda69f", "#40ad25", "#007700"]
 
 # Info reader for the pin/FA parameters
-def info_reader(filename) :
-    params = {}
-    # Read the input file, the output from initial visualization
-    with open("input.txt") as f:
-        # Read every line
-        for line in f:
-            if ':' in line:
-                # Get the keyword and value
-                key, value = line.strip().split(':')
-                key = key.strip()
-                value = value.strip()
-                
-                # Most of values are float, only one integer in nPin
-                try:
-                    # Convert to float all values
-                    value = float(value)
-                    # For nPin, convert to integer
-                    if key in ['nPin']:
-                        value = int(value)
-                except ValueError:
-                    # Keep as string if conversion fails
-                    pass
-                
-                params[key] = value
+# Reads the given parameter file (input.txt format, JSON or TOML), through the cache of ParamStore
+def info_reader(filename="input.txt") :
+    params = load_params(filename)
 
     return params
 
 # Core reader for integer or string FA name
 def core_reader(filename):
-    # Read the FA file for 1/4 symmetry
-    try:
-        # Try reading as int array first
-        core_map = np.loadtxt(filename)
-    except:
-        # If fails, read as string array
-        with open(filename, 'r') as f:
-            core_map = np.array([line.strip().split() for line in f.readlines()])
-
-    # Calculate the number of different kind of FA based on dtype
-    if np.issubdtype(core_map.dtype, np.number):
-        unique_FA = np.unique(core_map[core_map != 0])
-        empty_condition = lambda x: x > 0
-    else:
-        unique_FA = np.unique(core_map[core_map != 'O'])
-        empty_condition = lambda x: x != 'O'
-    
+    # Read the FA file for 1/4 symmetry, in a single pass, as compact integer codes
+    with stage('core_reader'):
+        lattice = LatticeMap.from_file(filename)
+        analysis = core_analysis(lattice)
+
+    return analysis
+
+# Analysis of a 1/4 symmetry core map given as LatticeMap
+def core_analysis(lattice):
+    # core_map is still given as float array if numeric or as string array
+    core_map = lattice.to_array()
+
+    # Calculate the number of different kind of FA, 0 or 'O' is not a FA
+    unique_FA = lattice.unique_labels()
     num_unique_FA = len(unique_FA)
 
     # Assign different color for each kind of FA
-    colors = ["#ff6637", "#56423c", "#bda69f", "#40ad25", "#007700"]
-    color_map = {value: colors[i % len(colors)] for i, value in enumerate(unique_FA)}
+    color_map = {value: fa_colors[i % len(fa_colors)] for i, value in enumerate(unique_FA)}
 
     # Rediscribe FA distribution
-    fa_per_layer = np.sum([empty_condition(x) for x in core_map], axis=1)
-    total_fa = np.sum([empty_condition(x) for x in core_map])
+    fa_per_layer = lattice.row_counts()
+    total_fa = lattice.total()
 
     analysis = {
         'num_unique_FA': num_unique_FA,
@@ -73,25 +54,45 @@ def core_reader(filename):
         'color_map': color_map,
         'fa_per_layer': fa_per_layer,
         'total_fa': total_fa,
-        'core_map' : core_map
+        'core_map' : core_map,
+        'lattice': lattice
     }
 
     return analysis
-    
 
-def CoreMapVisualizer(analysis, params):
+# Streaming core reader for files holding many 1/4 symmetry maps back to back
+# Maps are separated by blank lines or by header lines starting with '#' or '>', the header is the map name
+# One analysis is yielded per map, only the current map is kept in memory
+# With num_FA, the loading pattern analysis of PatternAnalysis is added as 'pattern'
+def iter_core_reader(filename, num_FA=None, FA_size=1.0):
+    for parsed in iter_parse_maps(filename):
+        lattice = LatticeMap(parsed['codes'], parsed['symbols'])
+        analysis = core_analysis(lattice)
+        analysis['name'] = parsed['name']
+        analysis['index'] = parsed['index']
+        analysis['line'] = parsed['line']
+        if num_FA is not None:
+            analysis['pattern'] = pattern_analysis(lattice, num_FA, FA_size)
+
+        yield analysis
+
+
+# Build the core map figure without showing it
+# Plotly is only imported here, reading the inputs does not need it
+def core_map_figure(analysis, params):
+    import plotly.graph_objects as go
+
     # Unpack the analysis and params
     # Unpack parameters
     core_radius = params['core_radius']
     active_core_radius = params['active_core_radius']
     FA_size = params['FA_size']
     num_FA = params['num_FA']
-    unique_FA = analysis['unique_FA']
     color_map = analysis['color_map']
     core_map = analysis['core_map']
 
-    # Create figure
-    fig = go.Figure()
+    # Create figure from the shared map template
+    fig = go.Figure(layout=dict(template=map_template(), title='Core Map (1/4 Symmetry)'))
 
     # Draw the core boundary circle (outer)
     fig.add_shape(
@@ -119,92 +120,26 @@ def CoreMapVisualizer(analysis, params):
         layer='below'
     )
 
-    # Check the dtype of core_map to determine how to handle empty positions
-    if np.issubdtype(core_map.dtype, np.number):
-        # For numeric arrays (int/float)
-        empty_condition = lambda x: x > 0
-    else:
-        # For string arrays
-        empty_condition = lambda x: x != 'O'
-
-    # Draw FA based on core map
+    # Draw FA based on core map, one batched trace for each kind of FA
+    # The trace name is also used as the legend entry of each FA
     if num_FA % 2 == 0:
         in_x, in_y = 0, 0
-        for i in range(len(core_map)):
-            for j in range(len(core_map[i])):
-                if empty_condition(core_map[i][j]):
-                    fig.add_shape(
-                        type="rect",
-                        x0=j*FA_size,
-                        y0=i*FA_size,
-                        x1=(j+1)*FA_size,
-                        y1=(i+1)*FA_size,
-                        line=dict(color="black", width=1),
-                        fillcolor=color_map[core_map[i][j]],
-                        opacity=1
-                    )
     else:
         in_x, in_y = -FA_size/2, -FA_size/2
-        for i in range(len(core_map)):
-            for j in range(len(core_map[i])):
-                if empty_condition(core_map[i][j]):
-                    fig.add_shape(
-                        type="rect",
-                        x0=(2*j-1)/2*FA_size,
-                        y0=(2*i-1)/2*FA_size,
-                        x1=(2*j+1)/2*FA_size,
-                        y1=(2*i+1)/2*FA_size,
-                        line=dict(color="black", width=1),
-                        fillcolor=color_map[core_map[i][j]],
-                        opacity=1
-                    )
-
-    # Add rectangles for legends for each unique FA
-    for value in unique_FA:
-        fig.add_trace(
-            go.Scatter(
-                x=[None],
-                y=[None],
-                mode='markers',
-                marker=dict(
-                    color=color_map[value],
-                    size=15,
-                    symbol='square'
-                ),
-                name=f'FA {value}',
-                showlegend=True
-            )
-        )
-
-    # Update layout
-    fig.update_layout(
-        width=800,
-        height=800,
-        showlegend=True,
-        plot_bgcolor='white',
-        title='Core Map (1/4 Symmetry)'
-    )
 
-    # Update axes
-    fig.update_xaxes(
-        range=[in_x, core_radius + 10],
-        scaleanchor='y',
-        constrain='domain',
-        scaleratio=1,
-        gridcolor='lightgrey',
-        zeroline=True,
-        zerolinewidth=2,
-        zerolinecolor='black'
-    )
-    fig.update_yaxes(
-        range=[in_y, core_radius + 10],
-        gridcolor='lightgrey',
-        constrain='domain',
-        zeroline=True,
-        zerolinewidth=2,
-        zerolinecolor='black'
-    )
+    for trace in core_map_traces(core_map, FA_size, num_FA, color_map):
+        fig.add_trace(trace)
+
+    # Update axes, the rest of the layout comes from the shared map template
+    fig.update_xaxes(range=[in_x, core_radius + 10], constrain='domain')
+    fig.update_yaxes(range=[in_y, core_radius + 10], constrain='domain')
 
-    fig.show()
+    return fig
+
+def CoreMapVisualizer(analysis, params):
+    with stage('core_map_figure'):
+        fig = core_map_figure(analysis, params)
+    with stage('show'):
+        fig.show()
 
     return 0
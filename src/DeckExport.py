@@ -0,0 +1,166 @@
+# Deck Export, lattice blocks of Monte Carlo inputs from core and FA maps
+# The 1/4 symmetry maps (or the full maps unfolded from them) are written as lattice/universe blocks for
+#   openmc   RectLattice XML element, first row of <universes> is the top of the lattice
+#   serpent  'lat' card of type 1 (square lattice), top row first by default
+#   mcnp     lat=1 cell with its fill card, bottom row first as the fill array runs with x first, then y
+# Every label of the map is replaced by a universe through a lookup table indexed by the LatticeMap codes,
+# the blocks come from templates compiled once, and each deck is written with a single buffered write
+# Lattices and universes share one id space in OpenMC and Serpent, so the ids are split in two ranges
+#   universes numbered automatically take 1 to 256 at most (one per label of the map)
+#   lattice ids start at lattice_base, write_decks numbers the candidates lattice_base, lattice_base + 1, ...
+# The empty position has no default universe (0 is the root universe of Serpent), it must be given
+
+import os
+import string
+from xml.sax.saxutils import quoteattr
+import numpy as np
+from LatticeMap import as_lattice
+from Instrumentation import count
+
+# Templates of the lattice blocks
+templates = {
+    'openmc': string.Template(
+        '<lattice id="$lattice_id" name=$name>\n'
+        '  <pitch>$pitch $pitch</pitch>\n'
+        '  <dimension>$cols $rows</dimension>\n'
+        '  <lower_left>$x0 $y0</lower_left>\n'
+        '  <universes>\n'
+        '$universes\n'
+        '  </universes>\n'
+        '</lattice>\n'),
+    'serpent': string.Template(
+        '% $name\n'
+        'lat $lattice_id 1 $xc $yc $cols $rows $pitch\n'
+        '$universes\n'),
+    'mcnp': string.Template(
+        'c $name\n'
+        '$lattice_id 0 -$surface lat=1 u=$lattice_universe imp:n=1\n'
+        '     fill=0:$col_end 0:$row_end 0:0\n'
+        '$universes\n'),
+}
+
+# First lattice id, above every automatic universe number
+lattice_base = 1000
+
+# Row order of each style, True when the top row comes first
+top_first_styles = {'openmc': True, 'serpent': True, 'mcnp': False}
+
+# Indent of the universe rows of each style, MCNP reads a line starting before column 6 as a new card
+indent_styles = {'openmc': '    ', 'serpent': '    ', 'mcnp': '      '}
+
+# Name as written in the block, quoted and escaped for the XML attribute of openmc
+def deck_name(name, style):
+    return quoteattr(name) if style == 'openmc' else name
+
+# Universe of every code of the lattice, as text
+# universes maps a label to its universe, labels missing from it are numbered from 1 in sorted order
+# The empty position or guide tube (0 or 'O') gets empty_universe unless universes gives it,
+# a map holding the empty position without any of the two raises ValueError
+def universe_table(lattice, universes=None, empty_universe=None):
+    universes = {} if universes is None else universes
+    table = []
+    number = 1
+    for code, label in enumerate(lattice.labels.tolist()):
+        if label in universes:
+            table.append(str(universes[label]))
+        elif code == lattice.empty_code:
+            if empty_universe is None and lattice.empty_mask().any():
+                raise ValueError("the map holds the empty position %r, give its universe with empty_universe "
+                                 "or universes" % (label,))
+            table.append(str(empty_universe))
+        else:
+            table.append(str(number))
+            number += 1
+
+    return np.array(table)
+
+# Text of the universe array, one line per row, columns aligned
+def universe_rows(codes, table, top_first, indent='    '):
+    width = max(len(universe) for universe in table.tolist()) if len(table) else 1
+    tokens = np.char.rjust(table, width)[codes]
+    if top_first:
+        tokens = tokens[::-1]
+
+    return "\n".join(indent + " ".join(row) for row in tokens.tolist())
+
+# Pitch and parity of the map, from the core parameters or the FA parameters
+def lattice_geometry(params, kind):
+    if kind == 'core':
+        return params['FA_size'], int(params['num_FA']) % 2 == 1
+    if kind == 'fa':
+        return params['pitch_size'], int(params['nPin']) % 2 == 1
+
+    raise ValueError("kind must be 'core' or 'fa', got %r" % (kind,))
+
+# Lattice block of one map as text
+# kind is 'core' (FA universes, pitch FA_size) or 'fa' (pin universes, pitch pitch_size)
+# With full=True the 1/4 map is unfolded to the full map, centered on the origin
+# For mcnp, surface is the cell boundary and lattice_universe the universe of the lattice cell (1000 + lattice_id by default)
+# For openmc and serpent a lattice id equal to one of its universes raises ValueError
+def deck_lattice(lattice, params, kind='core', style='openmc', full=True, universes=None, empty_universe=None,
+                 name=None, lattice_id=lattice_base, top_first=None, surface=1, lattice_universe=None):
+    if style not in templates:
+        raise ValueError("style must be one of %s, got %r" % (sorted(templates), style))
+    lattice = as_lattice(lattice)
+    pitch, odd = lattice_geometry(params, kind)
+    if full:
+        lattice = lattice.unfold(odd)
+    if top_first is None:
+        top_first = top_first_styles[style]
+
+    # Lower left corner, the full map is centered on the origin
+    # The 1/4 map starts at the axes, or half a pitch before them when the first cells lie on the axes
+    rows, cols = lattice.shape
+    if full:
+        x0, y0 = -cols*pitch/2, -rows*pitch/2
+    else:
+        x0 = y0 = -pitch/2 if odd else 0.0
+
+    table = universe_table(lattice, universes, empty_universe)
+    used = np.unique(lattice.codes)
+    if style != 'mcnp' and str(lattice_id) in table[used].tolist():
+        raise ValueError("lattice id %s is also a universe of the lattice" % lattice_id)
+
+    return templates[style].substitute(
+        name=deck_name(name if name is not None else "%s lattice" % kind, style),
+        lattice_id=lattice_id,
+        pitch=repr(float(pitch)),
+        rows=rows,
+        cols=cols,
+        row_end=rows - 1,
+        col_end=cols - 1,
+        x0=repr(float(x0)),
+        y0=repr(float(y0)),
+        xc=repr(float(x0 + cols*pitch/2)),
+        yc=repr(float(y0 + rows*pitch/2)),
+        surface=surface,
+        lattice_universe=lattice_universe if lattice_universe is not None else 1000 + lattice_id,
+        universes=universe_rows(lattice.codes, table, top_first, indent_styles[style])
+    )
+
+# Write the lattice block of one map, in a single write
+def write_deck(filename, lattice, params, **options):
+    text = deck_lattice(lattice, params, **options)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(text)
+    count('files_written')
+    count('bytes_written', len(text))
+
+    return filename
+
+# Write the decks of many candidates, maps is a dictionary name: map, or a list named deck_<index>
+# Each deck is one file named <name>.<extension> in directory, the lattice id grows with the candidate from first_id
+extensions = {'openmc': 'xml', 'serpent': 'inp', 'mcnp': 'i'}
+
+def write_decks(maps, params, directory, style='openmc', first_id=lattice_base, **options):
+    if not isinstance(maps, dict):
+        maps = {"deck_%04d" % index: lattice for index, lattice in enumerate(maps)}
+    os.makedirs(directory, exist_ok=True)
+
+    written = []
+    for index, (name, lattice) in enumerate(maps.items()):
+        filename = os.path.join(directory, "%s.%s" % (name, extensions[style]))
+        written.append(write_deck(filename, lattice, params, style=style, name=name,
+                                  lattice_id=first_id + index, **options))
+
+    return written
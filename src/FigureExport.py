@@ -0,0 +1,75 @@
+# Figure Export Pipeline, HTML, SVG and PNG for many maps at once, without fig.show()
+# HTML files point to a single plotly.min.js written once in the output directory,
+# or all figures go into one report page that loads plotly.js only once
+# SVG and PNG are written in one call of plotly.io.write_images when available,
+# so the static image renderer (kaleido) is started once for the whole batch
+
+import html
+import os
+import plotly.io as pio
+import plotly.offline
+from Instrumentation import stage, count, is_enabled
+
+# Write plotly.min.js in directory once, the HTML files of the same directory share it
+def write_plotlyjs(directory):
+    path = os.path.join(directory, "plotly.min.js")
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(plotly.offline.get_plotlyjs())
+
+    return path
+
+# Export many figures in every format of formats ('html', 'svg', 'png', 'jpeg', 'webp', 'pdf')
+# figures is a dictionary name: figure, or a list of figures named figure_<index>
+# Returns the list of written files
+def export_figures(figures, directory, formats=('html',), scale=1):
+    if not isinstance(figures, dict):
+        figures = {"figure_%04d" % index: fig for index, fig in enumerate(figures)}
+    os.makedirs(directory, exist_ok=True)
+    written = []
+
+    with stage('export_figures'):
+        for fmt in formats:
+            paths = [os.path.join(directory, "%s.%s" % (name, fmt)) for name in figures]
+
+            if fmt == 'html':
+                write_plotlyjs(directory)
+                for fig, path in zip(figures.values(), paths):
+                    pio.write_html(fig, path, include_plotlyjs='directory', full_html=True)
+
+            # Static images, one renderer process for the whole list when plotly supports it
+            elif hasattr(pio, 'write_images'):
+                pio.write_images(list(figures.values()), paths, format=fmt, scale=scale)
+            else:
+                for fig, path in zip(figures.values(), paths):
+                    pio.write_image(fig, path, format=fmt, scale=scale)
+
+            written += paths
+
+    count('files_written', len(written))
+    if is_enabled():
+        count('bytes_written', sum(os.path.getsize(path) for path in written if os.path.exists(path)))
+
+    return written
+
+# Single HTML report with every figure, plotly.js is embedded once at the top of the page
+def write_report(figures, filename, title="Core and Fuel Assembly Maps"):
+    if not isinstance(figures, dict):
+        figures = {"figure_%04d" % index: fig for index, fig in enumerate(figures)}
+
+    parts = ['<html>\n<head><meta charset="utf-8"/><title>%s</title></head>\n<body>\n' % html.escape(title),
+             '<script type="text/javascript">%s</script>\n' % plotly.offline.get_plotlyjs()]
+    for name, fig in figures.items():
+        parts.append('<h2>%s</h2>\n' % html.escape(str(name)))
+        parts.append(pio.to_html(fig, include_plotlyjs=False, full_html=False))
+        parts.append('\n')
+    parts.append('</body>\n</html>\n')
+
+    # One buffered write for the whole report
+    text = "".join(parts)
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write(text)
+    count('files_written')
+    count('bytes_written', len(text))
+
+    return filename
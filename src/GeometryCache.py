@@ -0,0 +1,123 @@
+# Memoization Cache for the core geometry
+# The same inputs of core_geometry are often calculated again and again in optimization loops
+# This script keeps the latest results in an LRU cache, with an optional on-disk tier (shelve)
+# so a restarted notebook still finds the results of the previous session
+# With tolerance, float inputs are quantized before building the key,
+# inputs closer than the tolerance share the result of the first one that was calculated
+# Disk entries are keyed with the tolerance and cache_version, so a shelf reopened with another tolerance,
+# or written by an older core_geometry, never serves a result of other inputs
+
+import shelve
+import numpy as np
+from collections import OrderedDict
+
+from CoreGeometry import core_geometry
+
+# Raise when the content of the core_geometry result changes, the older disk entries are then ignored
+cache_version = 3
+
+class GeometryCache:
+    def __init__(self, maxsize=1024, tolerance=None, path=None):
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # Persistent tier, opened once and kept open until close()
+        if path is not None:
+            self.store = shelve.open(path)
+        else:
+            self.store = None
+
+    # Key of the inputs, nPin stays integer and the floats are quantized if tolerance is given
+    # exact is part of the key, the exact fit gives another geometry for the same inputs
+    def key(self, fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+            exact=False):
+        values = [fuel_radius, gap, cladding_thickness, fuel_to_moderator_ratio, core_radius, core_gap_scale]
+        if self.tolerance is None:
+            values = [float(value) for value in values]
+        else:
+            values = [round(value/self.tolerance) for value in values]
+
+        return (int(nPin),) + tuple(values) + (bool(exact),)
+
+    # Key of the disk tier, the memory key with the tolerance and the cache version
+    def disk_key(self, key):
+        return repr((cache_version, self.tolerance) + key)
+
+    # Same inputs and result as core_geometry
+    def get(self, fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+            exact=False):
+        inputs = (fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale, exact)
+        key = self.key(*inputs)
+
+        # Memory tier
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return dict(self.entries[key])
+
+        # Disk tier
+        disk_key = self.disk_key(key)
+        if self.store is not None and disk_key in self.store:
+            self.disk_hits += 1
+            geometry = self.store[disk_key]
+        else:
+            self.misses += 1
+            geometry = core_geometry(*inputs)
+            if self.store is not None:
+                self.store[disk_key] = geometry
+
+        # The arrays are shared by every hit, so they are made read only
+        for value in geometry.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+
+        self.entries[key] = geometry
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+        return dict(geometry)
+
+    # Counters to see whether the cache pays off
+    def info(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits)/lookups if lookups else 0.0,
+            'size': len(self.entries),
+            'maxsize': self.maxsize
+        }
+
+    # Empty the memory tier and reset the counters, the disk tier is only emptied with disk=True
+    def clear(self, disk=False):
+        self.entries.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk and self.store is not None:
+            self.store.clear()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Default in-memory cache shared by cached_core_geometry
+geometry_cache = GeometryCache()
+
+def cached_core_geometry(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+                         exact=False):
+    return geometry_cache.get(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+                              exact)
@@ -10,64 +10,27 @@
 # Output can be pasted in most Monte Carlo code, 
 # at the most some modification is needed to change int to string  
 
-import math
-import numpy as np
-import plotly.graph_objects as go
-import plotly.subplots as sp
-
-def init_core_map(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale):
-
-    # Calculate pitch size based on fuel to moderator ratio
-    clad_radius = fuel_radius + gap + cladding_thickness
-    pin_area = clad_radius**2 * math.pi / fuel_to_moderator_ratio
-    pitch_size = pin_area**(1/2)
-
-    # Calculate the size of fuel assembly
-    FA_size = pitch_size * nPin
-
-    # Calculate the number of FA, already in 1/4 symmetry, would be number of grids in the visualizer
-    core_gap = core_gap_scale*FA_size # Can be scaled according to the desired gap
-    active_core_radius = core_radius - core_gap
-    num_FA = round(active_core_radius/FA_size)
-
-    # Visualize the core, using 1st quadrant symmetry
-
-    # Calculation for each layer
-    # See if the number of FA is odd or even
-    if num_FA % 2 == 0:
-        # For even number FA, the horizontal axis would be the bottom part of the FA, while the vertical axis would be the left part
-        # Get and array of y coordinate for the topside of each layer, as the limiting parameter of number of FA in each layer
-        num_layer = num_FA
-        y_coord = np.array([FA_size*i for i in np.arange(1, num_layer+1)])
-
-        # From the circle equation, we can determine the number of FA for each layer in the vertical axis
-        # x^2 + y^2 = r^2, with r^2 = (core_radius)^2
-        x_coord = np.array([math.sqrt(core_radius**2 - y**2) for y in y_coord])
-        num_FA_layer = np.array([math.floor(x/FA_size) for x in x_coord])
-        
-        # Sum up the number of FA in each layer
-        total_FA = np.sum(num_FA_layer)
-
-    else :
-        # For odd number FA, the horizontal and vertical axis would be the midpoint of the FA
-        # Get and array of y coordinate for the midpoint of each layer, as the limiting parameter of number of FA in each layer 
-        # Use the function of i/2 where i are odd number
-        num_layer = num_FA
-        y_coord = np.array([FA_size*i/2 for i in np.arange(1,2*num_layer+1,2)])
-
-        # From the circle equation, we can determine the number of FA for each layer in the vertical axis
-        # x^2 + y^2 = r^2, with r^2 = (active_core_radius)^2
-        x_coord = np.array([math.sqrt(core_radius**2 - y**2) for y in y_coord])
-        num_FA_layer = np.array([math.floor(x/FA_size) for x in x_coord])
-
-    # Make a matrix to store the FA positions (1 for FA present, 0 for empty)
-    mat_size = math.ceil(num_FA)
-    core_map = np.zeros((mat_size, mat_size))
-
-    for layer, num_fa in enumerate(num_FA_layer):
-        for i in range(int(num_fa)):
-            core_map[layer][i] = 1
-
+from MapRenderer import core_map_traces, pin_lattice_traces
+from CoreGeometry import core_geometry, export_core_geometry
+from Instrumentation import stage, count
+
+# Build the figure of the 1/4 core map and the single fuel assembly map from core_geometry
+def init_core_figure(geometry):
+    # Plotly is only imported when a figure is built
+    import plotly.subplots as sp
+
+    # Unpack the geometry
+    fuel_radius = geometry['fuel_radius']
+    gap = geometry['gap']
+    cladding_thickness = geometry['cladding_thickness']
+    nPin = geometry['nPin']
+    core_radius = geometry['core_radius']
+    active_core_radius = geometry['active_core_radius']
+    num_FA = geometry['num_FA']
+    FA_size = geometry['FA_size']
+    pitch_size = geometry['pitch_size']
+    core_map = geometry['core_map']
+    mat_FA = geometry['mat_FA']
 
     # Visualize both the 1/4 core map and the single fuel assembly map
 
@@ -108,179 +71,36 @@ def init_core_map(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_
         row=1, col=1
     )
 
-    # Draw the FA
+    # Draw the FA, all of them packed in a single batched trace
 
     # For even number FA, the square go from 0,0 to n_pin*FA_size, n_pin*FA_size
     # Following patter of (i,j)*FA_size for bottom left corner, (i+1, j+1)*FA_size for top right corner
-    if num_FA % 2 == 0:
-        # Add the fuel assemblies as squares
-        for i in range(len(core_map)):
-            for j in range(len(core_map[i])):
-                if core_map[i][j] == 1:
-                    # Create a square for each FA
-                    fig.add_shape(
-                        type="rect",
-                        x0=j*FA_size,
-                        y0=i*FA_size,
-                        x1=(j+1)*FA_size,
-                        y1=(i+1)*FA_size,
-                        line=dict(color="black", width=1),
-                        fillcolor="red",
-                        opacity=1,
-                        name='FA',
-                        row=1, col=1
-                    )
-        in_x, in_y = 0, 0
-
     # For odd number FA, the square go from -FA_size/2,-FA_size/2 to FA_size/2, FA_size/2
     # Following patter of (2i-1,2j-1)*FA_size for bottom left corner, (2i+1, 2j+1)*FA_size for top right corner
-    else: 
-        # Add the fuel assemblies as squares
-        for i in range(len(core_map)):
-            for j in range(len(core_map[i])):
-                if core_map[i][j] == 1:
-                    # Create a square for each FA
-                    fig.add_shape(
-                        type="rect",
-                        x0=(2*j-1)/2*FA_size,
-                        y0=(2*i-1)/2*FA_size,
-                        x1=(2*j+1)/2*FA_size,
-                        y1=(2*i+1)/2*FA_size,
-                        line=dict(color="black", width=1),
-                        fillcolor="red",
-                        opacity=1,
-                        name='FA',
-                        row=1, col=1
-                    )
+    for trace in core_map_traces(core_map, FA_size, num_FA, {1: "red"}, name='FA', showlegend=False):
+        fig.add_trace(trace, row=1, col=1)
+
+    if num_FA % 2 == 0:
+        in_x, in_y = 0, 0
+    else:
         in_x, in_y = -FA_size/2, -FA_size/2
 
     # Column 2, the single fuel assembly map also 1/4 symettry
 
     # For even FA, the horizontal and vertical axis overlapped with the botom and left part of the FA
-    # Following patter of (i,j)*FA_size for bottom left corner, (i+1, j+1)*FA_size for top right corner
-    if nPin % 2 == 0:
-        # For even number of pins
-        pin_range = range(nPin//2)
-        for i in pin_range:
-            for j in pin_range:
-                x_center = j * pitch_size + pitch_size / 2
-                y_center = i * pitch_size + pitch_size / 2
+    # For odd FA, the horizontal and vertical axis go through the center of the first pins
+    # All pins are fuel, mat_FA is full of ones
+    opacity = {'moderator': 0.7, 'cladding': 0.3, 'gap': 0.5, 'fuel': 0.7}
+    traces = pin_lattice_traces(mat_FA, nPin, pitch_size, fuel_radius, gap,
+                                cladding_thickness, {1: "red"}, opacity=opacity, showlegend=False)
+    for trace in traces:
+        fig.add_trace(trace, row=1, col=2)
 
-                # Add moderator (outermost)
-                fig.add_shape(
-                    type="rect",
-                    x0=j * pitch_size,
-                    y0=i * pitch_size,
-                    x1=(j+1) * pitch_size,
-                    y1=(i+1) * pitch_size,
-                    line=dict(color="green", width=1),
-                    fillcolor="lightblue",
-                    opacity=0.7,
-                    row=1, col=2
-                )
-                
-                # Add cladding (outermost)
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - (fuel_radius + gap + cladding_thickness),
-                    y0=y_center - (fuel_radius + gap + cladding_thickness),
-                    x1=x_center + (fuel_radius + gap + cladding_thickness),
-                    y1=y_center + (fuel_radius + gap + cladding_thickness),
-                    line=dict(color="green", width=1),
-                    fillcolor="green",
-                    opacity=0.3,
-                    row=1, col=2
-                )
-                
-                # Add gap
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - (fuel_radius + gap),
-                    y0=y_center - (fuel_radius + gap),
-                    x1=x_center + (fuel_radius + gap),
-                    y1=y_center + (fuel_radius + gap),
-                    line=dict(color="yellow", width=1),
-                    fillcolor="yellow",
-                    opacity=0.5,
-                    row=1, col=2
-                )
-                
-                # Add fuel (innermost)
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - fuel_radius,
-                    y0=y_center - fuel_radius,
-                    x1=x_center + fuel_radius,
-                    y1=y_center + fuel_radius,
-                    line=dict(color="red", width=1),
-                    fillcolor="red",
-                    opacity=0.7,
-                    row=1, col=2
-                )
+    if nPin % 2 == 0:
         x_in_fa, y_in_fa = 0 , 0
-        x_out_fa, y_out_fa = FA_size/2 + 1, FA_size/2 + 1
-
     else:
-        # For odd number of pins
-        pin_range = range((nPin+1)//2)
-        for i in pin_range:
-            for j in pin_range:
-                x_center = j * pitch_size
-                y_center = i * pitch_size
-
-                # Add moderator (outermost)
-                fig.add_shape(
-                    type="rect",
-                    x0=(2*j-1)/2 * pitch_size,
-                    y0=(2*i-1)/2 * pitch_size,
-                    x1=(2*j+1)/2 * pitch_size,
-                    y1=(2*i+1)/2 * pitch_size,
-                    line=dict(color="green", width=1),
-                    fillcolor="lightblue",
-                    opacity=0.7,
-                    row=1, col=2
-                )
-                
-                # Add cladding (outermost)
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - (fuel_radius + gap + cladding_thickness),
-                    y0=y_center - (fuel_radius + gap + cladding_thickness),
-                    x1=x_center + (fuel_radius + gap + cladding_thickness),
-                    y1=y_center + (fuel_radius + gap + cladding_thickness),
-                    line=dict(color="green", width=1),
-                    fillcolor="green",
-                    opacity=0.3,
-                    row=1, col=2
-                )
-                
-                # Add gap
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - (fuel_radius + gap),
-                    y0=y_center - (fuel_radius + gap),
-                    x1=x_center + (fuel_radius + gap),
-                    y1=y_center + (fuel_radius + gap),
-                    line=dict(color="yellow", width=1),
-                    fillcolor="yellow",
-                    opacity=0.5,
-                    row=1, col=2
-                )
-                
-                # Add fuel (innermost)
-                fig.add_shape(
-                    type="circle",
-                    x0=x_center - fuel_radius,
-                    y0=y_center - fuel_radius,
-                    x1=x_center + fuel_radius,
-                    y1=y_center + fuel_radius,
-                    line=dict(color="red", width=1),
-                    fillcolor="red",
-                    opacity=0.7,
-                    row=1, col=2
-                )
         x_in_fa, y_in_fa = -pitch_size/2 , -pitch_size/2
-        x_out_fa, y_out_fa = FA_size/2 + 1, FA_size/2 + 1
+    x_out_fa, y_out_fa = FA_size/2 + 1, FA_size/2 + 1
 
     # Update layout for the two subplots
     fig.update_layout(
@@ -334,40 +154,33 @@ def init_core_map(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_
         row=1, col=2
     )
 
-    fig.show()
-
-    # Export the 1/4 symettry core map as max_core.txt
-    np.savetxt("max_core.txt", core_map, fmt='%d')
+    return fig
 
-    # Export inputed parameters as input.txt
-    with open("input.txt", "w") as f:
-        f.write("fuel_radius: " + str(fuel_radius) + "\n")
-        f.write("gap: " + str(gap) + "\n")
-        f.write("cladding_thickness: " + str(cladding_thickness) + "\n")
-        f.write("nPin: " + str(nPin) + "\n")
-        f.write("fuel_to_moderator_ratio: " + str(fuel_to_moderator_ratio) + "\n")
-        f.write("core_radius: " + str(core_radius) + "\n")
-        f.write("core_gap: " + str(core_gap) + "\n")
-        f.write("active_core_radius: " + str(active_core_radius) + "\n")
-        f.write("num_FA: " + str(num_FA) + "\n")
-        f.write("FA_size: " + str(FA_size) + "\n")
-        f.write("pitch_size: " + str(pitch_size) + "\n")
-        f.close()
+# Calculate the initial core, then optionally show the figure and export the maps and parameters
+# With show=False and export=False nothing is drawn or written, same as calling core_geometry
+def init_core_map(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius, core_gap_scale,
+                  show=True, export=True, directory='.', exact=False):
 
-    # Make 1/4 symmetry FA matrix full of ones
-    if nPin % 2 == 0:
-        mat_size = nPin//2
-    else:
-        mat_size = (nPin+1)//2
+    # Calculate the geometry, pure calculation without side effect
+    with stage('core_geometry'):
+        geometry = core_geometry(fuel_radius, gap, cladding_thickness, nPin, fuel_to_moderator_ratio, core_radius,
+                                 core_gap_scale, exact)
+    count('core_cells', geometry['core_map'].size)
 
-    mat_FA = np.ones((mat_size, mat_size))
-
-    # Export the 1/4 symettry single fuel assembly map as <nPin>_allfuel_FA.txt
-    # First line explecites the size of the matrix
-    filename = "%d_allfuel_FA.txt" % nPin
-    np.savetxt(filename, mat_FA, fmt='%d')
-
-    return pitch_size, core_gap, active_core_radius, num_FA, num_FA_layer, core_map, mat_FA
+    # Visualize both the 1/4 core map and the single fuel assembly map
+    if show:
+        with stage('init_core_figure'):
+            fig = init_core_figure(geometry)
+        with stage('show'):
+            fig.show()
+
+    # Export max_core.txt, input.txt and <nPin>_allfuel_FA.txt
+    if export:
+        with stage('export_core_geometry'):
+            export_core_geometry(geometry, directory)
+
+    return (geometry['pitch_size'], geometry['core_gap'], geometry['active_core_radius'], geometry['num_FA'],
+            geometry['num_FA_layer'], geometry['core_map'], geometry['mat_FA'])
 
 # Main function
 # Inputs
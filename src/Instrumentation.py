@@ -0,0 +1,93 @@
+# Instrumentation, per stage timers and counters for the readers, geometry, figures and export
+# Stages are timed with stage(name) and quantities (cells, polygons, bytes, ...) are added with count(name, value)
+# Nothing is recorded unless instrumentation is active, then stage() returns a shared null context
+# and count() returns at once, so the hooks cost about one function call
+#
+#   with instrument() as report:
+#       analysis = core_reader("map_input.txt")
+#       CoreMapVisualizer(analysis, params)
+#   print(report['timers'], report['counters'])
+#
+# A callback(kind, name, value) and/or a logger receive every event as it happens, kind is 'stage' or 'count'
+
+import contextlib
+import logging
+import time
+
+# Reports being collected, the innermost instrument() is the last one
+active = []
+null_stage = contextlib.nullcontext()
+
+def is_enabled():
+    return bool(active)
+
+# Deliver one event to every active report
+def record(kind, name, value):
+    for report in active:
+        if kind == 'stage':
+            timer = report['timers'].setdefault(name, {'calls': 0, 'time': 0.0})
+            timer['calls'] += 1
+            timer['time'] += value
+        else:
+            report['counters'][name] = report['counters'].get(name, 0) + value
+
+        if report['callback'] is not None:
+            report['callback'](kind, name, value)
+        if report['logger'] is not None:
+            if kind == 'stage':
+                report['logger'].debug("stage %s %.3f ms", name, value*1e3)
+            else:
+                report['logger'].debug("count %s +%s", name, value)
+
+class Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record('stage', self.name, time.perf_counter() - self.start)
+        return False
+
+# Timer of one stage, used as 'with stage("core_reader"):'
+def stage(name):
+    if not active:
+        return null_stage
+
+    return Stage(name)
+
+# Add value to a counter
+def count(name, value=1):
+    if active:
+        record('count', name, value)
+
+# Start collecting, returns the report that stop() closes
+# logger=True logs to the 'CoreVis' logger at DEBUG level
+def start(callback=None, logger=None):
+    if logger is True:
+        logger = logging.getLogger('CoreVis')
+    report = {'timers': {}, 'counters': {}, 'callback': callback, 'logger': logger}
+    active.append(report)
+
+    return report
+
+def stop(report):
+    for index, entry in enumerate(active):
+        if entry is report:
+            del active[index]
+            break
+
+    return report
+
+# Collect timers and counters for the code run inside the with block
+@contextlib.contextmanager
+def instrument(callback=None, logger=None):
+    report = start(callback, logger)
+    try:
+        yield report
+    finally:
+        stop(report)
@@ -0,0 +1,122 @@
+# Material Inventory of fuel assemblies and cores, For Square Lattice
+# Areas of fuel, gap, cladding and moderator per pin type, per FA and for the whole core
+# A fuel pin cell holds the fuel, gap and cladding rings and the moderator around them, inside pitch_size x pitch_size
+# A guide tube (0 or 'O') is counted as moderator only, same as in the FA figure
+# The 1/4 symmetry maps are weighted with symmetry_weights, so the axis cells of odd maps are not counted twice
+# Volumes need the active height, masses need the density of each material
+# Everything is computed with bincount on the LatticeMap codes, also for whole batches of maps
+
+import math
+import numpy as np
+from LatticeMap import LatticeMap, as_lattice, batch_counts, symmetry_weights
+
+materials = ['fuel', 'gap', 'cladding', 'moderator']
+
+# Area of every material in one fuel pin cell, in the order of materials
+def pin_areas(params):
+    fuel_radius = params['fuel_radius']
+    gap_radius = fuel_radius + params['gap']
+    clad_radius = gap_radius + params['cladding_thickness']
+
+    return np.array([
+        math.pi*fuel_radius**2,
+        math.pi*(gap_radius**2 - fuel_radius**2),
+        math.pi*(clad_radius**2 - gap_radius**2),
+        params['pitch_size']**2 - math.pi*clad_radius**2
+    ])
+
+# Material areas of every code of a FA map, (codes, materials), the guide tube is moderator only
+def pin_table(lattice, params):
+    table = np.tile(pin_areas(params), (len(lattice.labels), 1))
+    if lattice.empty_code is not None:
+        table[lattice.empty_code] = [0, 0, 0, params['pitch_size']**2]
+
+    return table
+
+# Volumes and masses from the areas, materials on the last axis
+# density is a dictionary material: density, materials without density get no mass
+def add_volumes(inventory, height=None, density=None):
+    if height is None:
+        return inventory
+
+    for key in ['type_areas', 'areas']:
+        volumes = inventory[key]*height
+        inventory[key.replace('areas', 'volumes')] = volumes
+        if density is not None:
+            rho = np.array([density.get(material, 0.0) for material in materials])
+            inventory[key.replace('areas', 'masses')] = volumes*rho
+
+    return inventory
+
+# Inventory of one FA from its 1/4 symmetry map (FA_reader analysis, LatticeMap or array)
+# pin_counts and type_areas are per pin type of the full FA, areas is the whole FA, in the order of materials
+def fa_inventory(lattice, params, height=None, density=None):
+    lattice = as_lattice(lattice)
+
+    weights = symmetry_weights(lattice.shape, int(params['nPin']) % 2 == 1)
+    pin_counts = batch_counts(lattice.codes[None], len(lattice.labels), weights)[0]
+    type_areas = pin_counts[:, None]*pin_table(lattice, params)
+
+    inventory = {
+        'materials': materials,
+        'labels': lattice.labels,
+        'pin_counts': pin_counts.astype(int),
+        'type_areas': type_areas,
+        'areas': type_areas.sum(axis=0)
+    }
+
+    return add_volumes(inventory, height, density)
+
+# Material areas of every code of a core map, from the inventory of each FA type
+# fa_inventories is a dictionary FA label: fa_inventory, or a single fa_inventory used for every FA type
+def assembly_table(lattice, fa_inventories):
+    table = np.zeros((len(lattice.labels), len(materials)))
+    for code, label in enumerate(lattice.labels.tolist()):
+        if code == lattice.empty_code:
+            continue
+        if 'areas' in fa_inventories:
+            table[code] = fa_inventories['areas']
+        elif label in fa_inventories:
+            table[code] = fa_inventories[label]['areas']
+        else:
+            raise KeyError("no FA inventory for the FA type %r of the core map" % (label,))
+
+    return table
+
+# Inventory of the full core from its 1/4 symmetry map (core_reader analysis, LatticeMap or array)
+# fa_counts and type_areas are per FA type of the full core, areas is the whole core
+def core_inventory(lattice, params, fa_inventories, height=None, density=None):
+    lattice = as_lattice(lattice)
+
+    weights = symmetry_weights(lattice.shape, int(params['num_FA']) % 2 == 1)
+    fa_counts = batch_counts(lattice.codes[None], len(lattice.labels), weights)[0]
+    type_areas = fa_counts[:, None]*assembly_table(lattice, fa_inventories)
+
+    inventory = {
+        'materials': materials,
+        'labels': lattice.labels,
+        'fa_counts': fa_counts.astype(int),
+        'type_areas': type_areas,
+        'areas': type_areas.sum(axis=0)
+    }
+
+    return add_volumes(inventory, height, density)
+
+# Material areas of a batch of maps sharing one label table, such as the codes of a MapLibrary
+# kind='fa' takes params with nPin and the pin geometry, kind='core' takes params with num_FA and fa_inventories
+# Returns an array (maps, materials), multiply by the height for the volumes
+def inventory_batch(codes, labels, params, kind='fa', fa_inventories=None):
+    codes = np.asarray(codes)
+    lattice = LatticeMap(codes, labels)
+    if kind == 'fa':
+        table = pin_table(lattice, params)
+        odd = int(params['nPin']) % 2 == 1
+    elif kind == 'core':
+        table = assembly_table(lattice, fa_inventories)
+        odd = int(params['num_FA']) % 2 == 1
+    else:
+        raise ValueError("kind must be 'core' or 'fa', got %r" % (kind,))
+
+    counts = batch_counts(codes, len(lattice.labels), symmetry_weights(codes.shape[1:], odd))
+
+    return counts @ table
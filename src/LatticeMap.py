@@ -0,0 +1,164 @@
+# Lattice Map, compact representation of core and FA maps
+# The map is stored as small unsigned integer codes plus a code-to-label table
+# Numeric maps use 0 as empty position (no FA) or guide tube, string maps use 'O'
+# All masks and counts are computed on the codes, without Python loops over the cells
+
+import numpy as np
+from MapParser import parse_map
+
+class LatticeMap:
+    def __init__(self, codes, labels):
+        self.codes = np.asarray(codes)
+        self.labels = np.asarray(labels)
+        self.numeric = bool(np.issubdtype(self.labels.dtype, np.number))
+
+        # Code of the empty position or guide tube, None if the map has no empty position
+        self.empty_code = self.code_of(0 if self.numeric else 'O')
+
+    # Read a map file through the single pass parser
+    # triangular=True reads a 1/8 symmetry map and gives the 1/4 symmetry map
+    @classmethod
+    def from_file(cls, filename, triangular=False):
+        parsed = parse_map(filename, triangular)
+        return cls(parsed['codes'], parsed['symbols'])
+
+    # Build from a float or string array, such as the core_map of core_reader
+    @classmethod
+    def from_array(cls, array):
+        labels, codes = np.unique(np.asarray(array), return_inverse=True)
+        dtype = np.uint8 if len(labels) <= 256 else np.uint16
+        return cls(codes.reshape(np.shape(array)).astype(dtype), labels)
+
+    # Code of a label, None if the label is not in the table
+    def code_of(self, label):
+        matches = np.flatnonzero(self.labels == label)
+        if len(matches) == 0:
+            return None
+
+        return int(matches[0])
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.labels.nbytes
+
+    # Back to the float or string array used by the visualizers
+    def to_array(self):
+        return self.labels[self.codes]
+
+    # True on empty position (core map) or guide tube (FA map)
+    def empty_mask(self):
+        if self.empty_code is None:
+            return np.zeros(self.shape, dtype=bool)
+
+        return self.codes == self.empty_code
+
+    def guide_tube_mask(self):
+        return self.empty_mask()
+
+    def occupied_mask(self):
+        return ~self.empty_mask()
+
+    # Number of cells of each code, counts[code]
+    def counts(self):
+        return np.bincount(self.codes.ravel(), minlength=len(self.labels))
+
+    # Labels present in the map, sorted, with or without the empty label
+    def unique_labels(self, include_empty=False):
+        present = self.counts() > 0
+        if not include_empty and self.empty_code is not None:
+            present[self.empty_code] = False
+
+        return self.labels[present]
+
+    # Number of occupied cells in each row, and in the whole map
+    def row_counts(self):
+        return np.count_nonzero(self.occupied_mask(), axis=-1)
+
+    def total(self):
+        return int(np.count_nonzero(self.occupied_mask()))
+
+    # Full map and 1/4 map
+    # Row 0 of the 1/4 map is next to the horizontal axis and column 0 next to the vertical axis
+    # The full map keeps the same orientation, row index grows with y and column index with x
+    # For odd number of FA/pins the first row and column lie on the axes and are shared between quadrants
+
+    # The 4 quadrants of the full map, as views of the codes without copy
+    # For odd number the left and lower quadrants do not repeat the shared row/column
+    def quadrant_views(self, odd):
+        stop = 0 if odd else None
+        return {
+            'upper_right': self.codes,
+            'upper_left': self.codes[:, :stop:-1],
+            'lower_right': self.codes[:stop:-1, :],
+            'lower_left': self.codes[:stop:-1, :stop:-1]
+        }
+
+    # Full map from the 1/4 map, the full codes are gathered in a single allocation
+    def unfold(self, odd):
+        rows = unfold_index(self.shape[0], odd)
+        cols = unfold_index(self.shape[1], odd)
+        return LatticeMap(self.codes[np.ix_(rows, cols)], self.labels)
+
+    # 1/4 map from the full map, as a view of the codes without copy
+    # With check=True the full map must be symmetric on both axes
+    def fold(self, odd, check=False):
+        if check and not (np.array_equal(self.codes, self.codes[::-1, :]) and
+                          np.array_equal(self.codes, self.codes[:, ::-1])):
+            raise ValueError("the map is not symmetric on the horizontal and vertical axes")
+
+        row = (self.shape[0] - (1 if odd else 0))//2
+        col = (self.shape[1] - (1 if odd else 0))//2
+        return LatticeMap(self.codes[row:, col:], self.labels)
+
+    # True if the 1/4 map is symmetric on the diagonal, so it can be written as a 1/8 map
+    def is_octant_symmetric(self):
+        return self.shape[0] == self.shape[1] and np.array_equal(self.codes, self.codes.T)
+
+    # 1/4 map from a map where only the cells with j <= i (1/8 symmetry) are meaningful
+    @classmethod
+    def from_octant(cls, lattice):
+        lower = np.tri(lattice.shape[0], lattice.shape[1], dtype=bool)
+        return cls(np.where(lower, lattice.codes, lattice.codes.T), lattice.labels)
+
+# Accept the analysis of core_reader/FA_reader, a LatticeMap or a plain float/string map
+def as_lattice(lattice):
+    if isinstance(lattice, dict):
+        lattice = lattice['lattice']
+    if isinstance(lattice, LatticeMap):
+        return lattice
+
+    return LatticeMap.from_array(lattice)
+
+# Number of cells of every code in every map of a batch (maps, ...), as one bincount on the (map, code) index
+# weights is broadcast against codes, None counts every cell once, returns (maps, num_codes)
+def batch_counts(codes, num_codes, weights=None):
+    codes = np.asarray(codes)
+    maps = codes.shape[0]
+    index = (np.arange(maps)[:, None]*num_codes + codes.reshape(maps, -1).astype(np.intp)).ravel()
+    if weights is not None:
+        weights = np.broadcast_to(weights, codes.shape).ravel()
+
+    return np.bincount(index, weights=weights, minlength=maps*num_codes).reshape(maps, num_codes)
+
+# Index of the 1/4 map rows (or columns) that build the full map rows (or columns)
+# Mirrored part first, then the 1/4 map itself, the shared center is not repeated for odd number
+def unfold_index(size, odd):
+    stop = 0 if odd else -1
+    return np.concatenate([np.arange(size - 1, stop, -1), np.arange(size)])
+
+# Number of full core (or full FA) cells represented by each cell of a 1/4 symmetry map
+# For even number of FA/pins every cell is mirrored into 4 quadrants
+# For odd number of FA/pins the first row and column lie on the symmetry axes, they are shared by 2 quadrants
+# and the center cell is counted only once
+def symmetry_weights(shape, odd):
+    weights = np.full(shape, 4, dtype=int)
+    if odd:
+        weights[0, :] = 2
+        weights[:, 0] = 2
+        weights[0, 0] = 1
+
+    return weights
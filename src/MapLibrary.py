@@ -0,0 +1,172 @@
+# Map Library, binary storage for large collections of core or FA maps
+# A library is a directory with
+#   maps.bin      all maps stacked as uint8 codes, map after map, row by row
+#   library.json  shape, symbol table (code to label), names and parameters of the maps
+# The reader exposes maps.bin as a memory mapped 3D array (maps, rows, cols),
+# so a library of millions of patterns is sliced and analyzed without parsing and without loading it whole
+
+import json
+import os
+import numpy as np
+from LatticeMap import LatticeMap
+from MapParser import iter_parse_maps
+from Instrumentation import count
+
+# Plain Python value of a label, for the JSON sidecar
+def label_value(label):
+    return label.item() if hasattr(label, 'item') else label
+
+# Write maps one by one, the number of maps does not need to be known in advance
+# Every map must have the same shape, labels are added to the library symbol table as they appear
+# close() sorts the symbol table like MapParser/LatticeMap and renumbers the stored codes once,
+# so a map read from the library has the same labels and codes as the same map read from text
+class LibraryWriter:
+    def __init__(self, path, params=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.params = dict(params) if params is not None else {}
+        self.shape = None
+        self.numeric = None
+        self.symbols = []
+        self.codes = {}
+        self.names = []
+        self.file = open(os.path.join(path, "maps.bin"), "wb")
+
+    # Library code of every code of the lattice
+    def remap(self, lattice):
+        numeric = lattice.numeric
+        if self.numeric is None:
+            self.numeric = numeric
+        elif self.numeric != numeric:
+            raise ValueError("numeric and string maps can not be stored in the same library")
+
+        table = []
+        for label in lattice.labels.tolist():
+            code = self.codes.get(label)
+            if code is None:
+                code = len(self.symbols)
+                if code > 255:
+                    raise ValueError("a library holds at most 256 different labels")
+                self.codes[label] = code
+                self.symbols.append(label)
+            table.append(code)
+
+        return np.array(table, dtype=np.uint8)
+
+    def append(self, lattice, name=None):
+        if not isinstance(lattice, LatticeMap):
+            lattice = LatticeMap.from_array(lattice)
+        if self.shape is None:
+            self.shape = lattice.shape
+        elif lattice.shape != self.shape:
+            raise ValueError("map shape %s differs from the library shape %s" % (lattice.shape, self.shape))
+
+        self.file.write(self.remap(lattice)[lattice.codes].tobytes())
+        self.names.append(name)
+        count('bytes_written', lattice.codes.size)
+
+    # Sort the symbol table and rewrite maps.bin with the sorted codes, by chunks of the memory map
+    def sort_symbols(self, chunk=1 << 24):
+        order = np.argsort(np.array(self.symbols, dtype=float if self.numeric else str), kind='stable')
+        if np.array_equal(order, np.arange(len(order))):
+            return
+        rank = np.empty(len(order), dtype=np.uint8)
+        rank[order] = np.arange(len(order))
+        self.symbols = [self.symbols[index] for index in order]
+        self.codes = {label: code for code, label in enumerate(self.symbols)}
+
+        filename = os.path.join(self.path, "maps.bin")
+        if os.path.getsize(filename) == 0:
+            return
+        stored = np.memmap(filename, dtype=np.uint8, mode='r+')
+        for start in range(0, len(stored), chunk):
+            stored[start:start + chunk] = rank[stored[start:start + chunk]]
+        stored.flush()
+        del stored
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        self.sort_symbols()
+
+        metadata = {
+            'count': len(self.names),
+            'shape': list(self.shape) if self.shape is not None else [0, 0],
+            'dtype': 'uint8',
+            'numeric': bool(self.numeric),
+            'symbols': [label_value(label) for label in self.symbols],
+            'names': self.names if any(name is not None for name in self.names) else None,
+            'params': {key: label_value(value) for key, value in self.params.items()
+                       if isinstance(label_value(value), (int, float, str))}
+        }
+        with open(os.path.join(self.path, "library.json"), "w") as f:
+            json.dump(metadata, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Write a whole stack of maps at once, codes (maps, rows, cols) with their labels
+def write_library(path, codes, labels, params=None, names=None):
+    codes = np.asarray(codes)
+    with LibraryWriter(path, params) as writer:
+        if len(codes) == 0:
+            return path
+        # Every map shares the same labels, so the table is built once and the stack is written in one go
+        table = writer.remap(LatticeMap(codes[0], labels))
+        writer.shape = codes.shape[1:]
+        writer.file.write(table[codes].tobytes())
+        writer.names = list(names) if names is not None else [None]*len(codes)
+
+    return path
+
+# Convert a multi-map text archive into a library, streaming map by map
+def library_from_archive(archive, path, params=None, triangular=False):
+    with LibraryWriter(path, params) as writer:
+        for parsed in iter_parse_maps(archive, triangular):
+            writer.append(LatticeMap(parsed['codes'], parsed['symbols']), parsed['name'])
+
+    return path
+
+# Read only view of a library
+class MapLibrary:
+    def __init__(self, path, mode='r'):
+        with open(os.path.join(path, "library.json")) as f:
+            metadata = json.load(f)
+
+        self.path = path
+        self.count = metadata['count']
+        self.numeric = metadata['numeric']
+        self.labels = np.array(metadata['symbols'], dtype=float if self.numeric else str)
+        self.names = metadata['names']
+        self.params = metadata['params']
+
+        # Memory mapped stack of codes, nothing is read until it is used
+        shape = (self.count,) + tuple(metadata['shape'])
+        if self.count == 0:
+            self.codes = np.zeros(shape, dtype=np.uint8)
+        else:
+            self.codes = np.memmap(os.path.join(path, "maps.bin"), dtype=np.uint8, mode=mode, shape=shape)
+
+    def __len__(self):
+        return self.count
+
+    # One map as LatticeMap, its codes are a view of the memory map
+    def __getitem__(self, index):
+        return LatticeMap(self.codes[index], self.labels)
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    # Code of a label in the library, None if absent
+    def code_of(self, label):
+        matches = np.flatnonzero(self.labels == label)
+        return int(matches[0]) if len(matches) else None
+
+def open_library(path, mode='r'):
+    return MapLibrary(path, mode)
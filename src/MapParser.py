@@ -0,0 +1,153 @@
+# Map Parser for core and FA maps, For Square Lattice
+# Reads a map file in a single pass, numeric (0, 1, 2, ...) or symbolic ('O', 'F', 'W', ...)
+# Every token is interned into a symbol table, the map itself is stored as small integer codes
+# The symbol table is sorted, numerically for numeric maps, so the codes follow np.unique order
+# Lines starting with '#' and blank lines are skipped, same as np.loadtxt
+
+import os
+import re
+import numpy as np
+from Instrumentation import stage, count, is_enabled
+
+# Parse error with the position of the problem, line and column start from 1
+class MapParseError(ValueError):
+    def __init__(self, message, filename=None, line=None, column=None):
+        self.filename = filename
+        self.line = line
+        self.column = column
+        location = ""
+        if filename is not None:
+            location += "%s:" % filename
+        if line is not None:
+            location += "%d:" % line
+        if column is not None:
+            location += "%d:" % column
+        if location:
+            message = location + " " + message
+        super().__init__(message)
+
+# Parse the lines of one map, lines is an iterable of text lines, start is the number of the first line
+# With triangular=True the map is a 1/8 symmetry map, row k holds k+1 values (the cells with j <= k)
+# and the other half of the 1/4 map is filled by mirroring on the diagonal
+def parse_lines(lines, filename=None, start=1, triangular=False):
+    symbols = {}
+    codes = []
+    width = None
+
+    for line_number, line in enumerate(lines, start):
+        # Remove comment and skip blank line
+        text = line.split('#', 1)[0]
+        tokens = text.split()
+        if not tokens:
+            continue
+
+        # Every row must have the same number of tokens, or one more than the row before for 1/8 symmetry
+        if triangular:
+            width = len(codes) + 1
+        elif width is None:
+            width = len(tokens)
+        if len(tokens) != width:
+            column = find_column(text, width)
+            raise MapParseError("expected %d values in the row, found %d" % (width, len(tokens)),
+                                filename, line_number, column)
+
+        # Intern the tokens, new symbol get the next code
+        codes.append([symbols.setdefault(token, len(symbols)) for token in tokens])
+
+    if width is None:
+        raise MapParseError("empty map", filename)
+
+    # The map is numeric only if every symbol is a number
+    tokens = list(symbols)
+    try:
+        values = np.array([float(token) for token in tokens])
+        numeric = True
+    except ValueError:
+        values = np.array(tokens)
+        numeric = False
+
+    # Sort the symbol table, '1' and '1.0' are merged into a single numeric symbol
+    table, remap = np.unique(values, return_inverse=True)
+    dtype = np.uint8 if len(table) <= 256 else np.uint16
+    if triangular:
+        codes = mirror_triangle(codes)
+    codes = remap.astype(dtype)[np.array(codes, dtype=np.intp)]
+
+    parsed = {
+        'codes': codes,
+        'symbols': table,
+        'numeric': numeric
+    }
+
+    return parsed
+
+# Column of the first token after the expected width, or the end of the line if the row is too short
+def find_column(text, width):
+    starts = [match.start() for match in re.finditer(r'\S+', text)]
+    if len(starts) > width:
+        return starts[width] + 1
+
+    return len(text.rstrip()) + 1
+
+# Square 1/4 map from the rows of a 1/8 map, cell (i, j) with j > i is the mirror (j, i)
+def mirror_triangle(rows):
+    size = len(rows)
+    square = np.zeros((size, size), dtype=np.intp)
+    lower = np.tril_indices(size)
+    square[lower] = np.concatenate([np.asarray(row, dtype=np.intp) for row in rows])
+
+    return np.where(np.tri(size, dtype=bool), square, square.T)
+
+# Parse a map file, the file is read once
+def parse_map(filename, triangular=False):
+    with stage('parse_map'), open(filename) as f:
+        parsed = parse_lines(f, filename, triangular=triangular)
+        if is_enabled():
+            count('bytes_read', os.fstat(f.fileno()).st_size)
+            count('cells_parsed', parsed['codes'].size)
+
+    return parsed
+
+# Split a stream of lines holding many maps back to back
+# A blank line or a header line (starting with '#' or '>') ends the current map
+# The last header before a map is its name, None if there is no header
+# Yields (name, lines of the map, number of the first line), one map at a time
+def iter_map_blocks(lines, start=1):
+    name = None
+    block = []
+    first = start
+    for line_number, line in enumerate(lines, start):
+        text = line.strip()
+        if not text or text[0] in '#>':
+            if block:
+                yield name, block, first
+                block = []
+                name = None
+            if text:
+                name = text[1:].strip()
+            continue
+
+        if not block:
+            first = line_number
+        block.append(line)
+
+    if block:
+        yield name, block, first
+
+# Parse every map of a multi-map file, the file is streamed so its size is not limited by memory
+# Each parsed map also gets its 'name', its 'index' in the file and the 'line' where it starts
+def iter_parse_maps(filename, triangular=False):
+    with open(filename) as f:
+        for index, (name, block, first) in enumerate(iter_map_blocks(f)):
+            parsed = parse_lines(block, filename, first, triangular)
+            parsed['name'] = name
+            parsed['index'] = index
+            parsed['line'] = first
+            count('maps_parsed')
+
+            yield parsed
+
+# Back to the array type used by core_reader and FA_reader
+# float64 array for numeric map (same as np.loadtxt), unicode array for symbolic map
+def decode_map(parsed):
+    return parsed['symbols'][parsed['codes']]
@@ -0,0 +1,159 @@
+# Batched Map Renderer, For Square Lattice
+# This script builds the Plotly traces shared by the core and FA visualizers
+# Instead of adding one layout shape per assembly, every assembly of the same FA type
+# is packed into one filled Scatter trace, with NaN as separator between the squares
+# So the number of traces follows the number of FA types, not the size of the core
+
+# Plotly is imported on the first render only, so the geometry and parsing modules stay light
+
+import functools
+import numpy as np
+from LatticeMap import LatticeMap
+from Instrumentation import count
+
+# Closed outline of a unit square, the trailing NaN separates it from the next square
+square_x = np.array([0, 1, 1, 0, 0, np.nan])
+square_y = np.array([0, 0, 1, 1, 0, np.nan])
+
+# Closed outline of a unit circle, approximated by a polygon with circle_segments sides
+circle_segments = 32
+theta = np.linspace(0, 2*np.pi, circle_segments + 1)
+circle_x = np.append(np.cos(theta), np.nan)
+circle_y = np.append(np.sin(theta), np.nan)
+
+# Layout and axes shared by the core map and FA figures, built once and reused by every figure
+# Based on the default Plotly template, so only the map specific settings are overridden
+@functools.lru_cache(maxsize=None)
+def map_template():
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    template = go.layout.Template(pio.templates[pio.templates.default])
+    template.layout.update(
+        width=800,
+        height=800,
+        showlegend=True,
+        plot_bgcolor='white'
+    )
+    axis = dict(
+        gridcolor='lightgrey',
+        zeroline=True,
+        zerolinewidth=2,
+        zerolinecolor='black'
+    )
+    template.layout.xaxis.update(axis, scaleanchor='y', scaleratio=1)
+    template.layout.yaxis.update(axis)
+
+    return template
+
+# Pack many squares into one path
+def square_path(x0, y0, size):
+    # x0, y0 are the bottom left corners, size is the side of the square
+    x0 = np.asarray(x0, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    count('squares', x0.size)
+
+    # Broadcast every corner against the unit outline and flatten into one path
+    x = (x0[:, None] + square_x[None, :]*size).ravel()
+    y = (y0[:, None] + square_y[None, :]*size).ravel()
+
+    return x, y
+
+# Pack many circles of the same radius into one path
+def circle_path(x_center, y_center, radius):
+    x_center = np.asarray(x_center, dtype=float)
+    y_center = np.asarray(y_center, dtype=float)
+    count('circles', x_center.size)
+
+    x = (x_center[:, None] + circle_x[None, :]*radius).ravel()
+    y = (y_center[:, None] + circle_y[None, :]*radius).ravel()
+
+    return x, y
+
+# Single filled trace for a packed path, hovering on the fill shows the trace name
+def filled_trace(x, y, fillcolor, line_color, opacity, name, showlegend):
+    import plotly.graph_objects as go
+    count('traces')
+
+    return go.Scatter(
+        x=x,
+        y=y,
+        mode='lines',
+        fill='toself',
+        fillcolor=fillcolor,
+        line=dict(color=line_color, width=1),
+        opacity=opacity,
+        hoveron='fills',
+        hoverinfo='name',
+        name=name,
+        showlegend=showlegend
+    )
+
+# Build one trace per FA type for the 1/4 symmetry core map
+def core_map_traces(core_map, FA_size, num_FA, color_map, name='FA {}', showlegend=True):
+    # For even number FA, the bottom left FA starts at the axis
+    # For odd number FA, the bottom left FA is centered on the axis
+    if num_FA % 2 == 0:
+        offset = 0
+    else:
+        offset = -FA_size/2
+
+    traces = []
+    # Only the FA types in color_map are drawn, empty position (0 or 'O') is skipped
+    for value, color in color_map.items():
+        rows, cols = np.nonzero(core_map == value)
+        x, y = square_path(offset + cols*FA_size, offset + rows*FA_size, FA_size)
+
+        traces.append(filled_trace(x, y, color, "black", 1, name.format(value), showlegend))
+
+    return traces
+
+# Centers of every pin in the 1/4 symmetry FA, computed at once
+def pin_centers(nPin, pitch_size):
+    # For even number of pins, the axes are on the edge of the first pins
+    # For odd number of pins, the axes go through the center of the first pins
+    if nPin % 2 == 0:
+        positions = (np.arange(nPin//2) + 0.5) * pitch_size
+    else:
+        positions = np.arange((nPin+1)//2) * pitch_size
+
+    # x_center[i][j] follows column j, y_center[i][j] follows row i, same as fa_map[i][j]
+    x_center, y_center = np.meshgrid(positions, positions)
+
+    return x_center, y_center
+
+# Opacity of each material ring, same as the FA visualizer
+pin_opacity = {'moderator': 0.7, 'cladding': 0.4, 'gap': 0.7, 'fuel': 0.9}
+
+# Build the batched traces of the 1/4 symmetry FA, one trace per material ring and per pin type
+def pin_lattice_traces(fa_map, nPin, pitch_size, fuel_radius, gap, cladding_thickness, color_map,
+                       opacity=pin_opacity, name='Pin {}', showlegend=True):
+    x_center, y_center = pin_centers(nPin, pitch_size)
+    n = len(x_center)
+    fa_map = np.asarray(fa_map)[:n, :n]
+
+    # Guide tube is represented as 0 or 'O', only moderator is drawn there
+    fuel_pin = ~LatticeMap.from_array(fa_map).guide_tube_mask()
+
+    traces = []
+
+    # Moderator background for every pin position
+    x, y = square_path(x_center.ravel() - pitch_size/2, y_center.ravel() - pitch_size/2, pitch_size)
+    traces.append(filled_trace(x, y, "lightblue", "green", opacity['moderator'], 'Moderator', showlegend))
+
+    # Cladding and gap rings for every fuel pin
+    x, y = circle_path(x_center[fuel_pin], y_center[fuel_pin], fuel_radius + gap + cladding_thickness)
+    traces.append(filled_trace(x, y, "green", "green", opacity['cladding'], 'Cladding', showlegend))
+
+    x, y = circle_path(x_center[fuel_pin], y_center[fuel_pin], fuel_radius + gap)
+    traces.append(filled_trace(x, y, "yellow", "yellow", opacity['gap'], 'Gap', showlegend))
+
+    # Fuel, one trace per kind of fuel pin with its color from color_map
+    for value, color in color_map.items():
+        pin = fuel_pin & (fa_map == value)
+        if not pin.any():
+            continue
+        x, y = circle_path(x_center[pin], y_center[pin], fuel_radius)
+        traces.append(filled_trace(x, y, color, "red", opacity['fuel'], name.format(value), showlegend))
+
+    return traces
@@ -0,0 +1,181 @@
+# Map Session, interactive editing of a 1/4 symmetry core map
+# Cell edits update the FA counts, FA per layer, total FA and the FA kinds in place,
+# without running core_reader again on the whole map
+# The figure keeps one slot of 6 points (closed square + NaN) per cell in every FA trace,
+# so an edit only rewrites the slot of the cell in the old and the new trace, the other traces are not touched
+
+import numpy as np
+from CoreMapVis import core_analysis, core_map_figure, fa_colors
+from LatticeMap import LatticeMap
+from MapRenderer import square_x, square_y, filled_trace
+
+class MapSession:
+    def __init__(self, analysis, params):
+        lattice = analysis['lattice']
+        self.params = params
+        self.labels = list(lattice.labels.tolist())
+        self.numeric = lattice.numeric
+        self.empty_code = lattice.empty_code
+        # Own copy of the codes, uint16 leaves room for new labels
+        self.codes = lattice.codes.astype(np.uint16)
+
+        # Counts kept up to date by every edit
+        self.type_counts = list(lattice.counts().tolist())
+        self.fa_per_layer = lattice.row_counts()
+        self.total_fa = lattice.total()
+        self.color_map = dict(analysis['color_map'])
+
+        self.fig = None
+        self.trace_index = {}
+        self.paths = {}
+
+    # Code of a label, a new label gets a new code
+    def code(self, label):
+        label = float(label) if self.numeric else str(label)
+        if label not in self.labels:
+            self.labels.append(label)
+            self.type_counts.append(0)
+            if self.empty_code is None and label == (0 if self.numeric else 'O'):
+                self.empty_code = len(self.labels) - 1
+
+        return self.labels.index(label)
+
+    def is_empty(self, code):
+        return code == self.empty_code
+
+    @property
+    def unique_FA(self):
+        present = [label for code, label in enumerate(self.labels) if self.type_counts[code] > 0 and not self.is_empty(code)]
+
+        return np.array(sorted(present))
+
+    @property
+    def lattice(self):
+        return LatticeMap(self.codes, np.array(self.labels))
+
+    # Same dictionary as core_reader, from the current state of the session
+    def analysis(self):
+        analysis = core_analysis(self.lattice)
+        analysis['color_map'] = {label: self.color_map[label] for label in analysis['unique_FA'].tolist()}
+
+        return analysis
+
+    # Slotted outline of all cells of one code, cells of other codes are NaN
+    def slotted_path(self, code):
+        rows, cols = self.codes.shape
+        x0, y0 = self.cell_corner(*np.indices((rows, cols)))
+        x = x0[..., None] + square_x*self.params['FA_size']
+        y = y0[..., None] + square_y*self.params['FA_size']
+        x[self.codes != code] = np.nan
+        y[self.codes != code] = np.nan
+
+        return x.reshape(-1), y.reshape(-1)
+
+    # Bottom left corner of a cell, same placement as core_map_traces
+    def cell_corner(self, row, col):
+        FA_size = self.params['FA_size']
+        offset = 0 if self.params['num_FA'] % 2 == 0 else -FA_size/2
+
+        return offset + col*FA_size, offset + row*FA_size
+
+    # Build the figure once, a FigureWidget when widget=True and the widget package of Plotly is installed,
+    # a plain Figure otherwise
+    # The traces of core_map_figure are replaced by their slotted form
+    def figure(self, widget=True):
+        import plotly.graph_objects as go
+
+        analysis = self.analysis()
+        fig = core_map_figure(analysis, self.params)
+        if widget:
+            try:
+                fig = go.FigureWidget(fig)
+            except ImportError:
+                pass
+
+        self.fig = fig
+        self.trace_index = {}
+        self.paths = {}
+        with fig.batch_update():
+            for index, label in enumerate(analysis['color_map']):
+                code = self.labels.index(label)
+                self.paths[code] = self.slotted_path(code)
+                fig.data[index].x, fig.data[index].y = self.paths[code]
+                self.trace_index[code] = index
+
+        return fig
+
+    # Trace of a code, added with the next color when the label is new in the figure
+    def trace_of(self, code):
+        if code not in self.trace_index:
+            label = self.labels[code]
+            self.paths[code] = self.slotted_path(code)
+            x, y = self.paths[code]
+            self.fig.add_trace(filled_trace(x, y, self.color_map[label], "black", 1, 'FA {}'.format(label), True))
+            self.trace_index[code] = len(self.fig.data) - 1
+
+        return self.fig.data[self.trace_index[code]]
+
+    # Set one cell of the 1/4 map to label, returns the previous label
+    def edit(self, row, col, label):
+        return self.edit_cells([(row, col, label)])[0]
+
+    # Row and column inside the 1/4 map, negative indices count from the end as in NumPy
+    def cell_index(self, row, col):
+        rows, cols = self.codes.shape
+        if not (-rows <= row < rows and -cols <= col < cols):
+            raise IndexError("cell (%d, %d) is outside the %dx%d map" % (row, col, rows, cols))
+
+        return int(row) % rows, int(col) % cols
+
+    # Set many cells at once, cells is a list of (row, col, label)
+    # The figure, if built, receives one update per touched trace
+    def edit_cells(self, cells):
+        previous = []
+        touched = {}
+        for row, col, label in cells:
+            row, col = self.cell_index(row, col)
+            new = self.code(label)
+            old = int(self.codes[row, col])
+            previous.append(self.labels[old])
+            if new == old:
+                continue
+
+            self.codes[row, col] = new
+            self.type_counts[old] -= 1
+            self.type_counts[new] += 1
+            change = int(not self.is_empty(new)) - int(not self.is_empty(old))
+            self.fa_per_layer[row] += change
+            self.total_fa += change
+
+            if self.labels[new] not in self.color_map and not self.is_empty(new):
+                self.color_map[self.labels[new]] = fa_colors[len(self.color_map) % len(fa_colors)]
+
+            touched.setdefault(old, []).append((row, col))
+            touched.setdefault(new, []).append((row, col))
+
+        if self.fig is not None and touched:
+            self.patch(touched)
+
+        return previous
+
+    # Rewrite the slots of the edited cells in the traces of the old and new codes
+    def patch(self, touched):
+        size = self.params['FA_size']
+        with self.fig.batch_update():
+            for code, cells in touched.items():
+                if self.is_empty(code):
+                    continue
+                trace = self.trace_of(code)
+                x, y = self.paths[code]
+                for row, col in cells:
+                    slot = (row*self.codes.shape[1] + col)*len(square_x)
+                    if self.codes[row, col] == code:
+                        x0, y0 = self.cell_corner(row, col)
+                        x[slot:slot + len(square_x)] = x0 + square_x*size
+                        y[slot:slot + len(square_y)] = y0 + square_y*size
+                    else:
+                        x[slot:slot + len(square_x)] = np.nan
+                        y[slot:slot + len(square_y)] = np.nan
+                trace.x, trace.y = x, y
+                # A kind without FA left is hidden, trace and legend entry
+                trace.visible = self.type_counts[code] > 0
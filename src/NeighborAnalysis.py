@@ -0,0 +1,181 @@
+# Neighbor Analysis of core and FA maps, For Square Lattice
+# Type adjacency matrix, clusters of neighboring cells of the same type, and distance to the nearest guide tube
+# The axes of the 1/4 map are reflective, neighbor pairs are counted in the full core/FA:
+#   even number FA/pins: row/column 0 touches its own mirror across the axis
+#   odd number FA/pins: row/column 0 lies on the axis, its neighbor across the axis is row/column 1
+# Everything works on the LatticeMap codes with shifted comparisons, without loops over the cells
+
+import numpy as np
+from LatticeMap import as_lattice, symmetry_weights, unfold_index
+
+# Neighbor offsets counted once per pair, (row, column)
+offsets = {
+    4: [(0, 1), (1, 0)],
+    8: [(0, 1), (1, 0), (1, 1), (1, -1)],
+}
+
+# The two sides of every neighbor pair with offset (di, dj), di >= 0, as views of a map
+def pair_views(codes, di, dj):
+    rows, cols = codes.shape[-2:]
+    first_cols = slice(0, cols - dj) if dj >= 0 else slice(-dj, cols)
+    second_cols = slice(dj, cols) if dj >= 0 else slice(0, cols + dj)
+
+    return codes[..., :rows - di, first_cols], codes[..., di:, second_cols]
+
+# Neighbor pairs of the full core/FA expressed on the 1/4 map, as the two cells (flat indices of the 1/4 map)
+# and the number of full map pairs they stand for: 4 inside the 1/4 map, 2 on an axis or across an axis
+# Every pair of the unfolded map is mapped back to its 1/4 map cells, so each full map pair is counted once
+def quarter_pairs(shape, odd, connectivity=4):
+    rows, cols = shape
+    quarter = unfold_index(rows, odd)[:, None]*cols + unfold_index(cols, odd)[None, :]
+
+    first, second = [], []
+    for di, dj in offsets[connectivity]:
+        index_a, index_b = pair_views(quarter, di, dj)
+        first.append(index_a.ravel())
+        second.append(index_b.ravel())
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    # The same two cells in either order are one entry
+    size = rows*cols
+    pairs, multiplicity = np.unique(np.minimum(first, second)*size + np.maximum(first, second), return_counts=True)
+
+    return pairs // size, pairs % size, multiplicity
+
+# Number of neighbor pairs of the full core/FA between every two codes, from the 1/4 map
+# codes is one map (rows, cols) or a batch (maps, rows, cols)
+# Returns (codes, codes) or (maps, codes, codes), symmetric, the diagonal holds the pairs of the same code,
+# the like pairs of the diagonal match like_pairs of FitnessEvaluator
+def adjacency_counts(codes, num_codes, odd, connectivity=4):
+    codes = np.asarray(codes)
+    single = codes.ndim == 2
+    if single:
+        codes = codes[None]
+    maps = codes.shape[0]
+
+    first, second, multiplicity = quarter_pairs(codes.shape[1:], odd, connectivity)
+    flat = codes.reshape(maps, -1).astype(np.intp)
+    index = (np.arange(maps)*num_codes*num_codes)[:, None] + flat[:, first]*num_codes + flat[:, second]
+    counts = np.bincount(index.ravel(), weights=np.broadcast_to(multiplicity, index.shape).ravel(),
+                         minlength=maps*num_codes*num_codes).astype(np.int64)
+
+    counts = counts.reshape(maps, num_codes, num_codes)
+    matrix = counts + counts.transpose(0, 2, 1)
+    diagonal = np.arange(num_codes)
+    matrix[:, diagonal, diagonal] = counts[:, diagonal, diagonal]
+
+    return matrix[0] if single else matrix
+
+# Type adjacency matrix of one map, matrix[a][b] is the number of full core/FA neighbor pairs of the labels a and b
+def adjacency_matrix(lattice, odd, connectivity=4):
+    lattice = as_lattice(lattice)
+
+    return {'labels': lattice.labels,
+            'matrix': adjacency_counts(lattice.codes, len(lattice.labels), odd, connectivity)}
+
+# Cluster of every cell, cells of the same code connected through neighbors share the smallest cell index
+# Cells with skip_code (the empty position) get -1
+# Labels are propagated to the neighbors and shortened by pointer jumping until nothing changes
+def cluster_labels(codes, connectivity=4, skip_code=None):
+    codes = np.asarray(codes)
+    active = np.ones(codes.shape, dtype=bool) if skip_code is None else codes != skip_code
+    size = codes.size
+    labels = np.where(active, np.arange(size).reshape(codes.shape), size)
+
+    # Pairs of neighbors of the same code, as flat indices
+    index = np.arange(size).reshape(codes.shape)
+    first, second = [], []
+    for di, dj in offsets[connectivity]:
+        code_a, code_b = pair_views(codes, di, dj)
+        index_a, index_b = pair_views(index, di, dj)
+        active_a, _ = pair_views(active, di, dj)
+        same = (code_a == code_b) & active_a
+        first.append(index_a[same])
+        second.append(index_b[same])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    flat = labels.ravel()
+    while True:
+        smaller = np.minimum(flat[first], flat[second])
+        updated = flat.copy()
+        np.minimum.at(updated, first, smaller)
+        np.minimum.at(updated, second, smaller)
+        # Pointer jumping, every label points to a cell of the same cluster with a smaller label
+        valid = updated < size
+        updated[valid] = updated[updated[valid]]
+        if np.array_equal(updated, flat):
+            break
+        flat = updated
+
+    return np.where(flat < size, flat, -1).reshape(codes.shape)
+
+# Clusters of neighboring cells with the same type, for one map
+# The empty position (0 or 'O') is not clustered
+# size is the number of cells in the 1/4 map, total_size the number of cells of all its mirrored copies in the full map
+# A cluster touching row 0 is joined to its mirror across the horizontal axis, and the same for column 0,
+# so the full map holds copies = 4, 2 or 1 clusters of copy_size cells each
+# touches_axis marks the clusters joined to their mirror image in the full map
+def clusters(lattice, odd, connectivity=4):
+    lattice = as_lattice(lattice)
+    labels = cluster_labels(lattice.codes, connectivity, lattice.empty_code)
+
+    # Consecutive cluster numbers, -1 stays for the empty cells
+    flat = labels.ravel()
+    occupied = flat >= 0
+    roots, cluster = np.unique(flat[occupied], return_inverse=True)
+    cluster_map = np.full(flat.shape, -1)
+    cluster_map[occupied] = cluster
+    cluster_map = cluster_map.reshape(lattice.shape)
+
+    weights = symmetry_weights(lattice.shape, odd).ravel()[occupied]
+    num_cluster = len(roots)
+    total_size = np.bincount(cluster, weights=weights, minlength=num_cluster).astype(int)
+
+    # Clusters touching the horizontal axis (row 0) and the vertical axis (column 0)
+    row_0 = np.zeros(lattice.shape, dtype=bool)
+    row_0[0, :] = True
+    column_0 = np.zeros(lattice.shape, dtype=bool)
+    column_0[:, 0] = True
+    touches_row = np.bincount(cluster, weights=row_0.ravel()[occupied], minlength=num_cluster) > 0
+    touches_column = np.bincount(cluster, weights=column_0.ravel()[occupied], minlength=num_cluster) > 0
+    copies = 4 >> (touches_row.astype(int) + touches_column.astype(int))
+
+    return {
+        'cluster_map': cluster_map,
+        'labels': lattice.labels[lattice.codes.ravel()[roots]],
+        'size': np.bincount(cluster, minlength=num_cluster),
+        'total_size': total_size,
+        'copies': copies,
+        'copy_size': total_size // copies,
+        'touches_axis': touches_row | touches_column
+    }
+
+# Distance from the center of every pin to the center of the nearest guide tube (0 or 'O'), in pitch_size unit
+# unless pitch_size is given, inf when the FA has no guide tube
+# The mirrored guide tubes of the other quadrants are never closer than the guide tube itself,
+# since pins and guide tubes of the 1/4 map are on the same side of both axes, so the 1/4 map is enough
+# Exact Euclidean distance in two separable passes: first along the columns, then across them
+def guide_tube_distance(lattice, pitch_size=1.0, block=64):
+    lattice = as_lattice(lattice)
+    tube = lattice.guide_tube_mask()
+    rows, cols = lattice.shape
+    if not tube.any():
+        return np.full(lattice.shape, np.inf)
+
+    # Distance to the nearest guide tube of the same column, from the last one before and the first one after
+    row = np.arange(rows)[:, None]
+    before = np.maximum.accumulate(np.where(tube, row, -np.inf), axis=0)
+    after = np.minimum.accumulate(np.where(tube, row, np.inf)[::-1], axis=0)[::-1]
+    column_distance2 = np.minimum(row - before, after - row)**2
+
+    # Nearest over every column, (j - j')^2 + column distance^2, by blocks of rows for large FA
+    col = np.arange(cols)
+    across = (col[:, None] - col[None, :])**2
+    distance2 = np.empty(lattice.shape)
+    for start in range(0, rows, block):
+        part = column_distance2[start:start + block]
+        distance2[start:start + block] = (part[:, None, :] + across[None, :, :]).min(axis=2)
+
+    return np.sqrt(distance2) * pitch_size
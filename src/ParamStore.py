@@ -0,0 +1,151 @@
+# Parameter Store for the pin/FA/core parameters
+# Loads the 'key: value' input.txt written by init_core_map, or the same keys in JSON or TOML
+# Derived quantities (pitch_size, FA_size, core_gap, active_core_radius) are computed once at load
+# when they are not in the file
+# Loaded files are kept in memory and only read again when the file on disk changes
+
+import json
+import math
+import os
+import secrets
+from Instrumentation import count
+
+# Keys kept as integer, every other numeric value is float
+integer_keys = ['nPin']
+
+# Parameter dictionary, used the same way as the dictionary of info_reader
+class CoreParams(dict):
+    def __init__(self, values=(), derive=True):
+        super().__init__(values)
+        if derive:
+            self.derive()
+
+    # Fill the derived quantities that are missing, with the same formulas as core_geometry
+    def derive(self):
+        keys = ['fuel_radius', 'gap', 'cladding_thickness', 'fuel_to_moderator_ratio']
+        if 'pitch_size' not in self and all(key in self for key in keys):
+            clad_radius = self['fuel_radius'] + self['gap'] + self['cladding_thickness']
+            self['pitch_size'] = (clad_radius**2 * math.pi / self['fuel_to_moderator_ratio'])**(1/2)
+
+        if 'FA_size' not in self and 'pitch_size' in self and 'nPin' in self:
+            self['FA_size'] = self['pitch_size'] * self['nPin']
+
+        if 'core_gap' not in self and 'core_gap_scale' in self and 'FA_size' in self:
+            self['core_gap'] = self['core_gap_scale'] * self['FA_size']
+
+        if 'active_core_radius' not in self and 'core_radius' in self and 'core_gap' in self:
+            self['active_core_radius'] = self['core_radius'] - self['core_gap']
+
+        if 'num_FA' not in self and 'active_core_radius' in self and 'FA_size' in self:
+            self['num_FA'] = round(self['active_core_radius'] / self['FA_size'])
+
+        return self
+
+    def copy(self):
+        return CoreParams(self, derive=False)
+
+# Convert a text value, float for numbers and integer for integer_keys, string otherwise
+def convert_value(key, value):
+    try:
+        value = float(value)
+        if key in integer_keys:
+            value = int(value)
+    except ValueError:
+        pass
+
+    return value
+
+# Parse the 'key: value' format, the whole file is read at once
+def parse_text_params(text):
+    params = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition(':')
+        if sep:
+            key = key.strip()
+            params[key] = convert_value(key, value.strip())
+
+    return params
+
+# TOML needs tomllib (Python 3.11+) or the tomli package
+def parse_toml_params(text):
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError("reading TOML parameters needs Python 3.11+ or the tomli package")
+
+    return tomllib.loads(text)
+
+# Read a parameter file without cache, format from the extension
+def read_params(filename):
+    with open(filename, encoding="utf-8") as f:
+        text = f.read()
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.json':
+        values = json.loads(text)
+    elif extension == '.toml':
+        values = parse_toml_params(text)
+    else:
+        values = parse_text_params(text)
+
+    # JSON and TOML numbers go through the same integer/float rule as the text format
+    values = {key: convert_value(key, value) if isinstance(value, (int, float)) and not isinstance(value, bool)
+              else value for key, value in values.items()}
+
+    return CoreParams(values)
+
+# Loaded parameters, absolute path: ((modification time, size, inode), parameters)
+loaded_params = {}
+
+# Read a parameter file through the cache, the file is only read again when it changed on disk
+# Every call gets its own copy, so changing it does not change the cache
+def load_params(filename="input.txt"):
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    entry = loaded_params.get(path)
+    if entry is None or entry[0] != version:
+        entry = (version, read_params(path))
+        loaded_params[path] = entry
+
+    return entry[1].copy()
+
+# Mode of the file replaced by save_params, None for a new file
+def file_mode(filename):
+    try:
+        return os.stat(filename).st_mode & 0o7777
+    except FileNotFoundError:
+        return None
+
+# Write parameters as 'key: value' text, or JSON for a .json file
+# The file is written next to its final name and then renamed, so a reader never sees a half written file
+# The temporary file is created with mode 0o666 so the umask applies as for any new file,
+# and it takes the mode of the file it replaces
+def save_params(params, filename="input.txt"):
+    directory = os.path.dirname(os.path.abspath(filename))
+
+    if os.path.splitext(filename)[1].lower() == '.json':
+        text = json.dumps({key: value for key, value in params.items()}, indent=1)
+    else:
+        text = "".join("%s: %s\n" % (key, value) for key, value in params.items())
+
+    temporary = os.path.join(directory, ".%s.%d.%s.tmp" % (os.path.basename(filename), os.getpid(),
+                                                            secrets.token_hex(4)))
+    handle = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(handle, "w", encoding="utf-8") as f:
+            f.write(text)
+        mode = file_mode(filename)
+        if mode is not None:
+            os.chmod(temporary, mode)
+        os.replace(temporary, filename)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    count('bytes_written', len(text))
+
+    return filename
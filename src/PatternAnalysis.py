@@ -0,0 +1,84 @@
+# Loading Pattern Analyzer, For Square Lattice
+# Vectorized analysis of a 1/4 symmetry core map, on the integer codes of LatticeMap
+# Counts per FA type, per ring, per row/column, full core totals and radial distribution in one pass
+# Ring k holds the cells with max(i, j) = k, ring 0 is the center FA (odd) or the central 2x2 FA (even)
+# Radial distance is measured from the core center to the FA center, in FA_size unit unless FA_size is given
+
+import numpy as np
+from LatticeMap import as_lattice, symmetry_weights
+
+# Distance from the core center to the center of every cell of the 1/4 symmetry map
+def cell_radius(shape, odd, FA_size=1.0):
+    # For odd number FA the first FA is centered on the axes, for even number FA it starts at the axes
+    offset = 0.0 if odd else 0.5
+    rows = np.arange(shape[0])[:, None] + offset
+    cols = np.arange(shape[1])[None, :] + offset
+
+    return np.sqrt(rows**2 + cols**2) * FA_size
+
+def pattern_analysis(lattice, num_FA, FA_size=1.0):
+    # Accept the analysis of core_reader or a plain float/string core map as well
+    lattice = as_lattice(lattice)
+
+    codes = lattice.codes
+    shape = codes.shape
+    num_code = len(lattice.labels)
+    odd = num_FA % 2 == 1
+    flat = codes.ravel().astype(np.intp)
+
+    # Only the FA types are reported, the empty code is dropped from every table
+    keep = np.ones(num_code, dtype=bool)
+    if lattice.empty_code is not None:
+        keep[lattice.empty_code] = False
+    occupied = lattice.occupied_mask()
+
+    # Counts per FA type, in the 1/4 map and in the full core
+    weights = symmetry_weights(shape, odd)
+    type_counts = np.bincount(flat, minlength=num_code)
+    full_type_counts = np.bincount(flat, weights=weights.ravel(), minlength=num_code).astype(int)
+
+    # Counts per ring and FA type, one bincount on the combined (ring, code) index
+    ring = np.maximum.outer(np.arange(shape[0]), np.arange(shape[1])).ravel()
+    num_ring = int(ring.max()) + 1
+    ring_type_counts = np.bincount(ring*num_code + flat, minlength=num_ring*num_code).reshape(num_ring, num_code)
+
+    # Radial distribution per FA type, weighted by the full core multiplicity
+    radius = cell_radius(shape, odd, FA_size).ravel()
+    weighted = weights.ravel().astype(float)
+    sum_weight = full_type_counts.astype(float)
+    sum_radius = np.bincount(flat, weights=weighted*radius, minlength=num_code)
+    sum_radius2 = np.bincount(flat, weights=weighted*radius**2, minlength=num_code)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        radius_mean = sum_radius / sum_weight
+        radius_std = np.sqrt(np.maximum(sum_radius2/sum_weight - radius_mean**2, 0))
+    radius_max = np.full(num_code, np.nan)
+    np.fmax.at(radius_max, flat, radius)
+
+    # Same statistics for every FA together
+    occupied_flat = occupied.ravel()
+    total_weight = weighted[occupied_flat].sum()
+    if total_weight > 0:
+        core_radius_mean = float(np.sum(weighted*radius*occupied_flat) / total_weight)
+        core_radius_max = float(radius[occupied_flat].max())
+    else:
+        core_radius_mean = np.nan
+        core_radius_max = np.nan
+
+    analysis = {
+        'labels': lattice.labels[keep],
+        'type_counts': type_counts[keep],
+        'full_type_counts': full_type_counts[keep],
+        'ring_type_counts': ring_type_counts[:, keep],
+        'ring_counts': ring_type_counts[:, keep].sum(axis=1),
+        'row_counts': np.count_nonzero(occupied, axis=1),
+        'column_counts': np.count_nonzero(occupied, axis=0),
+        'total_fa': int(np.count_nonzero(occupied)),
+        'full_core_fa': int(weights[occupied].sum()),
+        'radius_mean': radius_mean[keep],
+        'radius_std': radius_std[keep],
+        'radius_max': radius_max[keep],
+        'core_radius_mean': core_radius_mean,
+        'core_radius_max': core_radius_max
+    }
+
+    return analysis
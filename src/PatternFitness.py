@@ -0,0 +1,145 @@
+# Loading Pattern Fitness, batch scoring of 1/4 symmetry core maps for optimization loops
+# Candidates are given as integer codes (maps, rows, cols), all sharing one label table (LatticeMap codes, MapLibrary)
+# Every figure of merit is computed for the whole batch at once, without reparsing or per map analysis
+#   count_error  distance of the full core FA counts from the target counts of each FA type
+#   radial       mean radius of the FA, weighted by a value per FA type (for example the enrichment)
+#   like_pairs   number of neighbor pairs of the same FA type in the full core, from shifted comparisons
+#   symmetry     number of cell pairs breaking the diagonal (1/8) symmetry
+#   score        weighted sum of the terms above, lower is better
+# The axes of the 1/4 map are reflective: for even number FA the cells of row/column 0 touch their mirror,
+# for odd number FA row/column 0 lie on the axes and their pairs are counted for the half inside the full core
+
+import numpy as np
+from LatticeMap import LatticeMap, batch_counts, symmetry_weights
+from PatternAnalysis import cell_radius
+
+class FitnessEvaluator:
+    # labels is the label table of the codes, shape the 1/4 map shape, num_FA gives the parity of the core
+    # target_counts: {label: full core number of FA}, values: {label: value} for the radial term
+    # target_radius: the radial term becomes the distance to it, adjacency_labels: FA types penalized
+    # when side by side (all FA types by default), weights: {term: weight} of the score
+    def __init__(self, labels, shape, num_FA, target_counts=None, values=None, target_radius=None,
+                 adjacency_labels=None, weights=None, FA_size=1.0):
+        lattice = LatticeMap(np.zeros(shape, dtype=np.uint8), labels)
+        self.labels = lattice.labels
+        self.num_codes = len(self.labels)
+        self.empty_code = lattice.empty_code
+        self.shape = tuple(shape)
+        odd = int(num_FA) % 2 == 1
+        self.odd = odd
+
+        # Full core multiplicity and radius of every cell
+        self.cell_weights = symmetry_weights(self.shape, odd).ravel().astype(float)
+        self.radius = cell_radius(self.shape, odd, FA_size).ravel()
+
+        # Target counts per code, codes without target are not compared
+        self.target = np.zeros(self.num_codes)
+        self.has_target = np.zeros(self.num_codes, dtype=bool)
+        for label, target in (target_counts or {}).items():
+            code = self.code(label)
+            self.target[code] = target
+            self.has_target[code] = True
+
+        # Value per code for the radial term, the empty position has no value
+        self.values = np.ones(self.num_codes)
+        if values is not None:
+            self.values = np.array([values.get(label, 0.0) for label in self.labels.tolist()], dtype=float)
+        if self.empty_code is not None:
+            self.values[self.empty_code] = 0.0
+        self.target_radius = target_radius
+
+        # Codes penalized when a neighbor has the same code
+        self.penalized = np.ones(self.num_codes, dtype=bool)
+        if adjacency_labels is not None:
+            self.penalized[:] = False
+            for label in adjacency_labels:
+                self.penalized[self.code(label)] = True
+        if self.empty_code is not None:
+            self.penalized[self.empty_code] = False
+
+        # Full core multiplicity of the horizontal pairs (i, j)-(i, j+1) and vertical pairs (i, j)-(i+1, j)
+        # For odd number FA a pair lying on an axis exists only twice in the full core
+        rows, cols = self.shape
+        self.horizontal = np.full((rows, cols - 1), 4.0)
+        self.vertical = np.full((rows - 1, cols), 4.0)
+        if odd:
+            self.horizontal[0, :] = 2.0
+            self.vertical[:, 0] = 2.0
+
+        self.weights = {'count_error': 1.0, 'radial': 0.0, 'like_pairs': 1.0, 'symmetry': 1.0}
+        self.weights.update(weights or {})
+
+    def code(self, label):
+        matches = np.flatnonzero(self.labels == label)
+        if len(matches) == 0:
+            raise KeyError("label %r is not in the label table %s" % (label, self.labels.tolist()))
+
+        return int(matches[0])
+
+    # Full core like neighbor pairs of every code in every map, (maps, codes)
+    def like_pairs(self, codes):
+        maps = codes.shape[0]
+        penalized = self.penalized[codes]
+        pairs = np.zeros((maps, self.num_codes))
+
+        shifts = [
+            (codes[:, :, :-1], codes[:, :, 1:], penalized[:, :, :-1], self.horizontal),
+            (codes[:, :-1, :], codes[:, 1:, :], penalized[:, :-1, :], self.vertical),
+        ]
+        # For even number FA the cells of row/column 0 touch their mirror, always the same code
+        if not self.odd:
+            shifts.append((codes[:, :, 0], codes[:, :, 0], penalized[:, :, 0], 2.0))
+            shifts.append((codes[:, 0, :], codes[:, 0, :], penalized[:, 0, :], 2.0))
+
+        for first, second, keep, multiplicity in shifts:
+            like = (first == second) & keep
+            weight = (like*multiplicity).reshape(maps, -1)
+            pairs += batch_counts(first.reshape(maps, -1), self.num_codes, weight)
+
+        return pairs
+
+    # Figures of merit of a batch (maps, rows, cols), or of a single map (rows, cols)
+    def evaluate(self, codes):
+        codes = np.asarray(codes)
+        single = codes.ndim == 2
+        if single:
+            codes = codes[None]
+        codes = codes.astype(np.intp)
+        maps = codes.shape[0]
+        flat = codes.reshape(maps, -1)
+
+        # FA counts of the full core against the targets
+        counts = batch_counts(flat, self.num_codes, self.cell_weights)
+        count_error = np.abs(counts - self.target)[:, self.has_target].sum(axis=1)
+
+        # Radial position of the FA weighted by their value
+        value = self.values[flat]*self.cell_weights
+        total = value.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            radial = (value*self.radius).sum(axis=1)/total
+        if self.target_radius is not None:
+            radial = np.abs(radial - self.target_radius)
+
+        # Neighbors of the same type and diagonal symmetry
+        pairs = self.like_pairs(codes)
+        like_pairs = pairs.sum(axis=1)
+        if self.shape[0] == self.shape[1]:
+            upper = np.triu(np.ones(self.shape, dtype=bool), 1)
+            symmetry = np.count_nonzero((codes != codes.transpose(0, 2, 1)) & upper, axis=(1, 2))
+        else:
+            symmetry = np.zeros(maps, dtype=int)
+
+        result = {
+            'type_counts': counts.astype(int),
+            'count_error': count_error,
+            'radial': radial,
+            'type_like_pairs': pairs.astype(int),
+            'like_pairs': like_pairs.astype(int),
+            'symmetry': symmetry
+        }
+        result['score'] = sum(weight*np.nan_to_num(result[term]) for term, weight in self.weights.items() if weight)
+
+        if single:
+            return {key: value[0] for key, value in result.items()}
+
+        return result
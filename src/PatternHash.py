@@ -0,0 +1,152 @@
+# Pattern Hash, canonical form and hash of core and FA maps for deduplication
+# A 1/4 symmetry map and its transpose (reflection on the diagonal) describe the same core,
+# the canonical form is the one of the two with the lexicographically smaller codes
+# With relabel=True the labels are renumbered by first appearance, so maps with the same layout
+# but different FA types also give the same hash, the empty position (0 or 'O') keeps its own code
+# Every step works on a whole batch of maps (maps, rows, cols) at once
+
+import hashlib
+import numpy as np
+from LatticeMap import LatticeMap, as_lattice, batch_counts
+
+# Renumber the codes of every map by first appearance in row major order, empty_code becomes 0
+# codes is (maps, cells) with codes below num_codes
+def relabel_codes(codes, num_codes, empty_code=None):
+    maps, cells = codes.shape
+
+    # First cell of every code in every map, cells when the code is absent
+    first = np.full((maps, num_codes), cells)
+    for code in range(num_codes):
+        found = codes == code
+        first[:, code] = np.where(found.any(axis=1), found.argmax(axis=1), cells)
+    if empty_code is not None:
+        first[:, empty_code] = -1
+
+    # Rank of every code by its first cell, the empty code comes first
+    # With no empty code in the table, the labels start at 1 so 0 stays the empty position
+    rank = np.argsort(np.argsort(first, axis=1, kind='stable'), axis=1)
+    if empty_code is None:
+        rank += 1
+
+    return np.take_along_axis(rank, codes.astype(np.intp), axis=1).astype(np.uint8)
+
+# Canonical codes of a batch of maps (maps, rows, cols), or a single map (rows, cols)
+# Square maps are compared with their transpose, the smaller one is kept
+def canonical_codes(codes, relabel=False, num_codes=None, empty_code=None):
+    codes = np.asarray(codes)
+    single = codes.ndim == 2
+    if single:
+        codes = codes[None]
+    maps, rows, cols = codes.shape
+    if num_codes is None:
+        num_codes = int(codes.max(initial=0)) + 1
+
+    candidates = [codes.reshape(maps, -1)]
+    if rows == cols:
+        candidates.append(codes.transpose(0, 2, 1).reshape(maps, -1))
+    if relabel:
+        candidates = [relabel_codes(candidate, num_codes, empty_code) for candidate in candidates]
+
+    canonical = candidates[0]
+    if len(candidates) == 2:
+        first, second = candidates
+        # Lexicographic order decided by the first cell where the two differ
+        differ = first != second
+        index = differ.argmax(axis=1)
+        pick = np.arange(maps)
+        smaller = differ.any(axis=1) & (second[pick, index] < first[pick, index])
+        canonical = np.where(smaller[:, None], second, first)
+
+    canonical = np.ascontiguousarray(canonical.reshape(maps, rows, cols), dtype=np.uint8)
+
+    return canonical[0] if single else canonical
+
+# Codes of a map (or a batch) expressed in the sorted order of the labels, so the same map always has the same codes
+# Returns the codes, the sorted labels and the code of the empty label
+def sorted_codes(lattice):
+    order = np.argsort(lattice.labels, kind='stable')
+    rank = np.empty(len(order), dtype=np.uint8)
+    rank[order] = np.arange(len(order))
+    empty_code = None if lattice.empty_code is None else int(rank[lattice.empty_code])
+
+    return rank[lattice.codes], lattice.labels[order], empty_code
+
+# Codes of every map renumbered over the labels present in that map, keeping their sorted order,
+# so the hash does not depend on the labels of the table that the map does not use
+# codes is (maps, rows, cols), returns the compact codes and the mask of the present codes (maps, codes)
+def compact_codes(codes, num_codes):
+    maps = codes.shape[0]
+    present = batch_counts(codes, num_codes) > 0
+    rank = np.cumsum(present, axis=1) - 1
+    flat = codes.reshape(maps, -1).astype(np.intp)
+
+    return np.take_along_axis(rank, flat, axis=1).astype(np.uint8).reshape(codes.shape), present
+
+# Hash of the canonical codes, the shape and, without relabel, the labels present in the map
+def digest(canonical, labels=None, digest_size=16):
+    h = hashlib.blake2b(digest_size=digest_size)
+    h.update(repr(canonical.shape).encode())
+    if labels is not None:
+        h.update(repr(np.asarray(labels).tolist()).encode())
+    h.update(canonical.tobytes())
+
+    return h.digest()
+
+# Hash of one map, LatticeMap or float/string array
+def pattern_hash(lattice, relabel=False, digest_size=16):
+    lattice = as_lattice(lattice)
+
+    return pattern_hashes(lattice.codes[None], lattice.labels, relabel, digest_size)[0]
+
+# Hashes of a batch of maps sharing one label table, such as the codes of a MapLibrary
+# The same map gets the same hash whatever the table holds (core_reader, LatticeMap.from_array or MapLibrary)
+def pattern_hashes(codes, labels, relabel=False, digest_size=16):
+    codes, labels, empty_code = sorted_codes(LatticeMap(np.asarray(codes), labels))
+
+    # Relabeled codes only depend on the order of first appearance, the labels are not hashed
+    if relabel:
+        canonical = canonical_codes(codes, True, len(labels), empty_code)
+        return [digest(canonical[index], None, digest_size) for index in range(len(canonical))]
+
+    codes, present = compact_codes(codes, len(labels))
+    canonical = canonical_codes(codes)
+
+    return [digest(canonical[index], labels[present[index]], digest_size) for index in range(len(canonical))]
+
+# Set of maps indexed by their hash, keeps the name (or index) of the first map of every pattern
+class PatternSet:
+    def __init__(self, relabel=False, digest_size=16):
+        self.relabel = relabel
+        self.digest_size = digest_size
+        self.patterns = {}
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, lattice):
+        return pattern_hash(lattice, self.relabel, self.digest_size) in self.patterns
+
+    # Add one map, True if the pattern is new
+    def add(self, lattice, name=None):
+        return self.add_hash(pattern_hash(lattice, self.relabel, self.digest_size), name)
+
+    def add_hash(self, key, name=None):
+        if key in self.patterns:
+            self.duplicates += 1
+            return False
+        self.patterns[key] = name if name is not None else len(self.patterns)
+
+        return True
+
+    # Add a batch of maps sharing one label table, returns the boolean mask of the new patterns
+    def add_batch(self, codes, labels, names=None):
+        keys = pattern_hashes(codes, labels, self.relabel, self.digest_size)
+        if names is None:
+            names = [None]*len(keys)
+
+        return np.array([self.add_hash(key, name) for key, name in zip(keys, names)], dtype=bool)
+
+    # Name of the first map with the same pattern, None if the pattern is new
+    def first_of(self, lattice):
+        return self.patterns.get(pattern_hash(lattice, self.relabel, self.digest_size))
@@ -0,0 +1,118 @@
+# Raster Renderer for core and FA maps, For Square Lattice
+# Lightweight alternative to the Plotly figures, for thumbnails and very large batches
+# Maps are turned directly into NumPy RGB arrays through a color palette indexed by the LatticeMap codes
+# Pins are drawn with a circular mask precomputed once from fuel_radius, gap and cladding_thickness
+# PNG files are written with the standard library only (zlib), no imaging package is needed
+# Row 0 of the maps is drawn at the bottom of the image, same as the Plotly figures
+
+import struct
+import zlib
+import numpy as np
+from LatticeMap import as_lattice
+from Instrumentation import count
+
+# Named colors used by the visualizers, other colors must be given as '#rrggbb'
+named_colors = {
+    'white': (255, 255, 255),
+    'black': (0, 0, 0),
+    'red': (255, 0, 0),
+    'green': (0, 128, 0),
+    'yellow': (255, 255, 0),
+    'blue': (0, 0, 255),
+    'lightblue': (173, 216, 230),
+    'lightgrey': (211, 211, 211),
+}
+
+def parse_color(color):
+    if color in named_colors:
+        return named_colors[color]
+    color = color.lstrip('#')
+
+    return tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
+
+# Palette of a map, palette[code] is the RGB color of the label, labels missing from color_map get empty_color
+def map_palette(lattice, color_map, empty_color='white'):
+    colors = [color_map.get(label, empty_color) for label in lattice.labels.tolist()]
+    if lattice.empty_code is not None:
+        colors[lattice.empty_code] = empty_color
+
+    return np.array([parse_color(color) for color in colors], dtype=np.uint8)
+
+# Rasterize integer codes of any leading shape (..., rows, cols), each cell becomes cell_px x cell_px pixels
+# A batch of maps sharing one palette is rendered in one call with codes of shape (maps, rows, cols)
+def raster_codes(codes, palette, cell_px=8, grid_color=None):
+    image = palette[codes[..., ::-1, :]]
+    image = np.repeat(np.repeat(image, cell_px, axis=-3), cell_px, axis=-2)
+
+    # Cell borders on the first pixel row and column of every cell
+    if grid_color is not None and cell_px > 2:
+        border = np.arange(image.shape[-2]) % cell_px == 0
+        image[..., border, :] = parse_color(grid_color)
+        border = np.arange(image.shape[-3]) % cell_px == 0
+        image[..., border, :, :] = parse_color(grid_color)
+
+    return image
+
+# RGB image of a 1/4 symmetry core map, color_map is the one of core_reader
+def raster_core_map(core_map, color_map, cell_px=8, empty_color='white', grid_color='black'):
+    lattice = as_lattice(core_map)
+    palette = map_palette(lattice, color_map, empty_color)
+
+    return raster_codes(lattice.codes, palette, cell_px, grid_color)
+
+# Material ring of every pixel of one pin cell, 0 fuel, 1 gap, 2 cladding, 3 moderator
+def pin_mask(pitch_size, fuel_radius, gap, cladding_thickness, pin_px=16):
+    position = ((np.arange(pin_px) + 0.5)/pin_px - 0.5) * pitch_size
+    distance = np.hypot(position[:, None], position[None, :])
+    radii = np.array([fuel_radius, fuel_radius + gap, fuel_radius + gap + cladding_thickness])
+
+    return np.searchsorted(radii, distance).astype(np.intp)
+
+# RGB image of a 1/4 symmetry FA map, color_map is the one of FA_reader
+# Guide tube (0 or 'O') is drawn as moderator only, like the Plotly figure
+def raster_fa_map(fa_map, color_map, params, pin_px=16):
+    lattice = as_lattice(fa_map)
+    ring = pin_mask(params['pitch_size'], params['fuel_radius'], params['gap'], params['cladding_thickness'], pin_px)
+
+    # Color of every (code, ring) pair
+    fuel = map_palette(lattice, color_map, 'lightblue')
+    table = np.empty((len(lattice.labels), 4, 3), dtype=np.uint8)
+    table[:, 0] = fuel
+    table[:, 1] = parse_color('yellow')
+    table[:, 2] = parse_color('green')
+    table[:, 3] = parse_color('lightblue')
+    if lattice.empty_code is not None:
+        table[lattice.empty_code] = parse_color('lightblue')
+
+    # (rows, cols, pin_px, pin_px, 3) gathered at once, then laid out as one image
+    codes = lattice.codes[::-1, :]
+    image = table[codes[:, :, None, None], ring[None, None, :, :]]
+    rows, cols = codes.shape
+
+    return image.transpose(0, 2, 1, 3, 4).reshape(rows*pin_px, cols*pin_px, 3)
+
+# PNG chunk with its length and CRC
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+# Encode an RGB uint8 image (height, width, 3) as PNG bytes
+def png_bytes(image, level=6):
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+
+    # Every scanline starts with filter type 0
+    raw = np.zeros((height, width*3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width*3)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", header) +
+            png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)) + png_chunk(b"IEND", b""))
+
+def write_png(filename, image, level=6):
+    data = png_bytes(image, level)
+    with open(filename, "wb") as f:
+        f.write(data)
+    count('files_written')
+    count('bytes_written', len(data))
+
+    return filename